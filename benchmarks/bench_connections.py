@@ -0,0 +1,76 @@
+"""Ops/sec of the pooled WAL connection manager versus a connection per call.
+
+    python benchmarks/bench_connections.py [ops]
+"""
+import os
+import sys
+import time
+import sqlite3
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import inventory_core
+
+
+def legacy_get_product(path, pid):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute('SELECT * FROM products WHERE id=?', (pid,)).fetchone()
+    conn.close()
+    return row
+
+
+def legacy_record_sale(path, pid, qty):
+    product = legacy_get_product(path, pid)
+    conn = sqlite3.connect(path)
+    conn.execute('INSERT INTO sales (product_id, quantity, total_price, sold_at) VALUES (?, ?, ?, ?)',
+                 (pid, qty, qty * product['price'], datetime.datetime.utcnow().isoformat()))
+    conn.execute('UPDATE products SET quantity = quantity - ? WHERE id = ?', (qty, pid))
+    conn.commit()
+    conn.close()
+
+
+def seed(path, journal_mode, n_products=1000):
+    inventory_core.close_conns()
+    inventory_core.DB_FILE = path
+    inventory_core.JOURNAL_MODE = journal_mode
+    inventory_core.init_db()
+    with inventory_core.transaction() as conn:
+        conn.executemany('INSERT INTO products (sku,name,description,price,quantity,min_quantity) VALUES (?, ?, ?, ?, ?, ?)',
+                         ((f'SKU{i:06d}', f'Product {i}', '', 1.5, 10 ** 9, 5) for i in range(n_products)))
+    inventory_core.close_conns()
+
+
+def timed(label, ops, fn):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<28} {ops / elapsed:>10.0f} ops/sec')
+
+
+def main(ops=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, 'legacy.db')
+        pooled_db = os.path.join(tmp, 'pooled.db')
+        seed(legacy_db, 'DELETE')
+        seed(pooled_db, 'WAL')
+
+        timed('get_product (per-call)', ops, lambda i: legacy_get_product(legacy_db, i % 1000 + 1))
+        timed('record_sale (per-call)', ops, lambda i: legacy_record_sale(legacy_db, i % 1000 + 1, 1))
+
+        inventory_core.DB_FILE = pooled_db
+        timed('get_product (pooled)', ops, lambda i: inventory_core.get_product(i % 1000 + 1))
+        timed('record_sale (pooled)', ops, lambda i: inventory_core.record_sale(i % 1000 + 1, 1))
+
+        def batched(i):
+            with inventory_core.transaction():
+                for j in range(10):
+                    inventory_core.record_sale((i * 10 + j) % 1000 + 1, 1)
+        timed('record_sale x10 (1 txn)', ops // 10, batched)
+        inventory_core.close_conns()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
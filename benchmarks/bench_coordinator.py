@@ -0,0 +1,115 @@
+"""Load test for the write coordinator: N simulated terminals writing at once.
+
+Each terminal process records sales and restocks as fast as it can, first
+writing directly to the database, then through a coordinator. Reports call
+latency percentiles, writes/sec and commits/sec for both.
+
+    python benchmarks/bench_coordinator.py [terminals] [writes per terminal] [NORMAL|FULL]
+
+The last argument sets PRAGMA synchronous; FULL syncs on every commit, as a
+shared or network disk effectively does.
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+import statistics
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import inventory_core
+import inventory_coordinator
+
+PRODUCTS = 50
+
+
+def _use(path, synchronous):
+    inventory_core.DB_FILE = path
+    inventory_core.PRAGMAS = tuple(p for p in inventory_core.PRAGMAS if p[0] != 'synchronous') + (('synchronous', synchronous),)
+
+
+def terminal(path, synchronous, seed, writes, start, results):
+    _use(path, synchronous)
+    inventory_core.USE_COORDINATOR = True
+    latencies = []
+    errors = 0
+    start.wait()
+    for i in range(writes):
+        pid = (seed + i * 7) % PRODUCTS + 1
+        t = time.perf_counter()
+        try:
+            if i % 5 == 4:
+                inventory_core.restock_product(pid, 1)
+            else:
+                inventory_core.record_sale(pid, 1)
+        except sqlite3.OperationalError:
+            # database is locked
+            errors += 1
+        latencies.append((time.perf_counter() - t) * 1000)
+    results.put((latencies, errors))
+
+
+def coordinator(path, synchronous, ready, stop, out):
+    _use(path, synchronous)
+    c = inventory_coordinator.Coordinator()
+    threading.Thread(target=lambda: (stop.wait(), c.stop()), daemon=True).start()
+    threading.Thread(target=lambda: (time.sleep(0.2), ready.set()), daemon=True).start()
+    c.serve_forever()
+    out.put(c.stats())
+
+
+def run(path, synchronous, terminals, writes):
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=terminal, args=(path, synchronous, n * 13, writes, start, results)) for n in range(terminals)]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - began
+    for p in procs:
+        p.join()
+    latencies = sorted(ms for lat, _ in outcomes for ms in lat)
+    return latencies, sum(e for _, e in outcomes), elapsed
+
+
+def report(label, latencies, errors, elapsed, commits):
+    q = statistics.quantiles(latencies, n=100)
+    print(f'{label:12} p50 {q[49]:7.2f} ms  p95 {q[94]:7.2f} ms  p99 {q[98]:7.2f} ms  max {latencies[-1]:8.2f} ms  '
+          f'{len(latencies) / elapsed:8.0f} writes/s  {commits / elapsed:8.0f} commits/s  {errors} locked')
+
+
+def main(terminals=8, writes=500, synchronous='NORMAL'):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'load.db')
+        inventory_core.DB_FILE = path
+        inventory_core.init_db()
+        for i in range(PRODUCTS):
+            inventory_core.add_product(f'LOAD{i}', f'Load {i}', '', 1.0, 10 ** 9, 0)
+        inventory_core.close_conns()
+        print(f'{terminals} terminals x {writes} writes, synchronous={synchronous}')
+
+        latencies, errors, elapsed = run(path, synchronous, terminals, writes)
+        report('direct', latencies, errors, elapsed, len(latencies))
+
+        ready, stop, out = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Queue()
+        proc = multiprocessing.Process(target=coordinator, args=(path, synchronous, ready, stop, out))
+        proc.start()
+        ready.wait()
+        latencies, errors, elapsed = run(path, synchronous, terminals, writes)
+        stop.set()
+        stats = out.get()
+        proc.join()
+        report('coordinator', latencies, errors, elapsed, stats['commits'])
+        print(f"             {stats['requests']} calls in {stats['commits']} commits, "
+              f"mean group {stats['mean_group']}, largest {stats['largest_group']}")
+        failures = inventory_core.verify_daily_sales()
+        print('rollup ok' if not failures else f'{len(failures)} rollup rows differ')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]], *sys.argv[3:4])
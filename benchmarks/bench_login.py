@@ -0,0 +1,39 @@
+"""Login and bulk user provisioning timings at the configured PBKDF2 cost.
+
+    python benchmarks/bench_login.py [users]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import inventory_core
+
+
+def main(users=100):
+    with tempfile.TemporaryDirectory() as tmp:
+        inventory_core.DB_FILE = os.path.join(tmp, 'login.db')
+        inventory_core.init_db()
+        print(f'PBKDF2-{inventory_core.PASSWORD_ALGORITHM}, {inventory_core.PASSWORD_ITERATIONS} iterations')
+
+        start = time.perf_counter()
+        for _ in range(5):
+            inventory_core.authenticate('admin', 'admin123')
+        print(f'login:                {(time.perf_counter() - start) / 5 * 1000:8.1f} ms')
+
+        start = time.perf_counter()
+        for i in range(users):
+            inventory_core.add_user(f'serial{i}', 'secret')
+        serial = time.perf_counter() - start
+        print(f'add_user x{users} (serial): {serial:8.2f} s')
+
+        start = time.perf_counter()
+        inventory_core.add_users([(f'pooled{i}', 'secret') for i in range(users)])
+        pooled = time.perf_counter() - start
+        print(f'add_users x{users} (pool):  {pooled:8.2f} s  ({serial / pooled:.1f}x, {os.cpu_count()} CPUs)')
+        inventory_core.close_conns()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
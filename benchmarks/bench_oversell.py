@@ -0,0 +1,80 @@
+"""Multi-process oversell stress test for record_sale / record_sales.
+
+Several processes sell the same few products until stock runs out, then the
+script checks that no product went negative and that units sold match the
+sales table exactly.
+
+    python benchmarks/bench_oversell.py [processes] [stock per product]
+"""
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import inventory_core
+
+PRODUCTS = 5
+
+
+def terminal(path, seed, results):
+    inventory_core.DB_FILE = path
+    sold = attempts = 0
+    rejected = 0
+    i = seed
+    while True:
+        i += 1
+        pid = i % PRODUCTS + 1
+        if i % 4 == 0:
+            ok, _ = inventory_core.record_sales([(pid, 1), (pid % PRODUCTS + 1, 1)])
+            units = 2
+        else:
+            ok, _ = inventory_core.record_sale(pid, 1)
+            units = 1
+        attempts += 1
+        if ok:
+            sold += units
+        else:
+            rejected += 1
+            # stop once everything is gone
+            if all(p['quantity'] == 0 for p in inventory_core.get_products()):
+                break
+    results.put((sold, attempts, rejected))
+
+
+def main(processes=8, stock=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stress.db')
+        inventory_core.DB_FILE = path
+        inventory_core.init_db()
+        for i in range(PRODUCTS):
+            inventory_core.add_product(f'STRESS{i}', f'Stress {i}', '', 1.0, stock, 0)
+        inventory_core.close_conns()
+
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=terminal, args=(path, n * 7919, results)) for n in range(processes)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        outcomes = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        sold = sum(o[0] for o in outcomes)
+        attempts = sum(o[1] for o in outcomes)
+        negative = inventory_core.get_conn().execute('SELECT COUNT(*) FROM products WHERE quantity < 0').fetchone()[0]
+        in_sales = inventory_core.get_conn().execute('SELECT ifnull(SUM(quantity), 0) FROM sales').fetchone()[0]
+        oversold = sold - PRODUCTS * stock
+        print(f'processes={processes} stock={PRODUCTS}x{stock}')
+        print(f'units sold: {sold}  recorded in sales: {in_sales}  oversold: {max(0, oversold)}  negative stock rows: {negative}')
+        print(f'attempts: {attempts}  throughput: {attempts / elapsed:.0f} attempts/sec, {sold / elapsed:.0f} units/sec')
+        inventory_core.close_conns()
+        if negative or oversold > 0 or in_sales != sold:
+            sys.exit('FAILED: stock was oversold')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
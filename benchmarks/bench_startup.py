@@ -0,0 +1,45 @@
+"""Cold-start import cost of the core, the mainay entry module and the GUI.
+
+Uses python -X importtime and reports each module's cumulative import time,
+plus the wall time of a full CLI invocation.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('inventory_core', 'mainay', 'inventory_gui')
+
+
+def import_time(module):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    for line in out.splitlines():
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f'{module} not found in -X importtime output')
+
+
+def main(runs=5):
+    for module in MODULES:
+        # best of several runs, the first one may hit a cold disk cache
+        best = min(import_time(module) for _ in range(runs))
+        print(f'import {module:<16} {best:8.1f} ms')
+    with tempfile.TemporaryDirectory() as tmp:
+        cmd = [sys.executable, os.path.join(ROOT, 'inventory.py'), '--db', os.path.join(tmp, 'startup.db'), 'low-stock']
+        subprocess.run(cmd, check=True, capture_output=True)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(cmd, check=True, capture_output=True)
+            timings.append(time.perf_counter() - start)
+        print(f'inventory low-stock      {min(timings) * 1000:8.1f} ms wall')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
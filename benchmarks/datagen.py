@@ -0,0 +1,100 @@
+"""Deterministic synthetic inventory data for benchmarks.
+
+    python benchmarks/datagen.py out.db --products 100000 --sales 1000000 [--seed 0]
+
+The same seed and sizes always produce the same rows, so timings from
+different runs and machines are comparable.
+"""
+import os
+import sys
+import random
+import datetime
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import inventory_core
+
+SCALES = {
+    'small': (1000, 10000),
+    'medium': (100000, 1000000),
+    'large': (1000000, 10000000),
+}
+CHUNK = 50000
+WORDS = ('red', 'blue', 'green', 'steel', 'oak', 'cotton', 'glass', 'mini', 'pro', 'max', 'eco', 'classic',
+         'bolt', 'lamp', 'chair', 'cable', 'shirt', 'mug', 'drill', 'paint', 'tape', 'box', 'filter', 'brush')
+# synthetic sales run up to this day so results do not depend on today's date
+END_DAY = datetime.date(2025, 1, 1)
+
+
+def product_rows(n, rng):
+    for i in range(n):
+        name = ' '.join(rng.choice(WORDS) for _ in range(3)) + f' {i}'
+        sku = f'SKU-{i:07d}' if rng.random() > 0.02 else None
+        qty = rng.randint(0, 500)
+        minq = rng.randint(1, 50)
+        yield (sku, name, f'Synthetic product {i}', round(rng.uniform(0.5, 500.0), 2), qty, minq)
+
+
+def sale_rows(n, products, days, rng):
+    start = datetime.datetime.combine(END_DAY - datetime.timedelta(days=days), datetime.time())
+    span = days * 86400
+    # a few products sell far more than the rest, like a real catalogue
+    for _ in range(n):
+        pid = min(int(rng.paretovariate(1.2)), products)
+        pid = (pid * 7919) % products + 1
+        qty = rng.randint(1, 5)
+        sold_at = start + datetime.timedelta(seconds=rng.randrange(span))
+        yield (pid, qty, round(qty * (1 + pid % 97), 2), sold_at.isoformat())
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(path, products, sales, seed=0, days=730):
+    """Create path (which must not exist) with the given number of products and sales."""
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(seed)
+    old = inventory_core.DB_FILE
+    inventory_core.close_conns()
+    inventory_core.DB_FILE = path
+    try:
+        inventory_core.init_db()
+        with inventory_core.transaction() as conn:
+            for chunk in _chunks(product_rows(products, rng)):
+                conn.executemany('INSERT INTO products (sku,name,description,price,quantity,min_quantity) VALUES (?, ?, ?, ?, ?, ?)', chunk)
+            # sales are inserted sorted, as record_sale would have written them over time
+            for chunk in _chunks(sale_rows(sales, products, days, rng)):
+                chunk.sort(key=lambda r: r[3])
+                conn.executemany('INSERT INTO sales (product_id, quantity, total_price, sold_at) VALUES (?, ?, ?, ?)', chunk)
+        inventory_core.rebuild_daily_sales()
+        inventory_core.prune_product_changes(0)
+        inventory_core.get_conn().execute('ANALYZE')
+    finally:
+        inventory_core.close_conns()
+        inventory_core.DB_FILE = old
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--scale', choices=SCALES, help='preset sizes, overridden by --products/--sales')
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--sales', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    products, sales = SCALES[args.scale or 'small']
+    generate(args.path, args.products or products, args.sales if args.sales is not None else sales, args.seed)
+
+
+if __name__ == '__main__':
+    main()
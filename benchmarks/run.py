@@ -0,0 +1,187 @@
+"""Benchmark harness: seed databases at several scales and time the data layer.
+
+    python benchmarks/run.py --scale small --scale medium --output results.json
+    python benchmarks/run.py --scale small --baseline results.json --tolerance 0.25
+
+Seeded databases are cached in --data-dir (keyed by scale and seed), and each
+scale is copied before timing so write benchmarks never touch the cache. With
+--baseline the run fails if any median is slower than baseline * (1 + tolerance).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import datetime
+import statistics
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import inventory_core as core
+import inventory_analytics
+import datagen
+
+
+def benchmarks(products, scratch):
+    """(name, fn) pairs; fn(i) runs one iteration, i counts up from 0. Files go in scratch."""
+    mid = products // 2 + 1
+    middle_name = core.get_product(mid)['name']
+
+    def populate_table(i):
+        # what the dashboard's table load does, minus the Treeview
+        with core.transaction(immediate=False):
+            core.last_change_seq()
+            core.get_products_page('name')
+
+    def page_forward(i):
+        core.get_products_page('price', after=(250.0, mid))
+
+    def apply_changes(i):
+        since = core.last_change_seq()
+        core.restock_product(i % products + 1, 1)
+        core.get_product_changes(since, core.PAGE_SIZE)
+
+    def chart_series(i):
+        data = core.sales_summary()
+        core.downsample_lttb(list(range(len(data))), [r[1] for r in data], 600)
+
+    def export_sales_month(i):
+        core.export_sales_csv(os.path.join(scratch, 'sales.csv'), '2024-06-01', '2024-07-01')
+
+    def search_as_you_type(i):
+        # every prefix of a product name, as the dashboard sees it while typing
+        search = core.ProductSearch()
+        for n in range(1, len(middle_name) + 1):
+            search.search(middle_name[:n])
+
+    def import_products(i):
+        # re-imports the catalogue as upserts
+        if not os.path.exists(os.path.join(scratch, 'products.csv')):
+            core.export_products_csv(os.path.join(scratch, 'products.csv'))
+        core.import_products_csv(os.path.join(scratch, 'products.csv'))
+
+    return [
+        ('get_product', lambda i: core.get_product(i % products + 1)),
+        # a small working set, as when the same rows are clicked repeatedly
+        ('get_product_hot', lambda i: core.get_product(i % 50 + 1)),
+        ('get_products_all', lambda i: core.get_products()),
+        ('get_products_search', lambda i: core.get_products(middle_name.split()[0], core.SEARCH_LIMIT)),
+        ('search_as_you_type', search_as_you_type),
+        ('get_products_page', lambda i: core.get_products_page('name')),
+        ('page_forward', page_forward),
+        ('record_sale', lambda i: core.record_sale(i % products + 1, 1)),
+        ('record_sales_basket5', lambda i: core.record_sales([((i * 5 + k) % products + 1, 1) for k in range(5)])),
+        ('restock_product', lambda i: core.restock_product(i % products + 1, 1)),
+        ('sales_summary', lambda i: core.sales_summary()),
+        ('sales_rollup_month', lambda i: core.sales_rollup('month')),
+        ('get_low_stock', lambda i: core.get_low_stock()),
+        ('analytics_low_stock', lambda i: inventory_analytics.low_stock_report(500)),
+        ('export_products_csv', lambda i: core.export_products_csv(os.path.join(scratch, 'products.csv'))),
+        ('export_sales_month', export_sales_month),
+        ('import_products_csv', import_products),
+        ('gui_populate_table', populate_table),
+        ('gui_apply_changes', apply_changes),
+        ('gui_chart_series', chart_series),
+    ]
+
+
+def time_fn(fn, repeat, budget):
+    # at least one run, then stop early once the time budget is spent
+    timings = []
+    started = time.perf_counter()
+    for i in range(repeat):
+        t = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - t) * 1000)
+        if time.perf_counter() - started > budget:
+            break
+    return {'median_ms': statistics.median(timings), 'min_ms': min(timings), 'runs': len(timings)}
+
+
+def seeded_db(data_dir, scale, seed):
+    products, sales = datagen.SCALES[scale]
+    path = os.path.join(data_dir, f'bench-{scale}-{products}-{sales}-seed{seed}.db')
+    if not os.path.exists(path):
+        print(f'seeding {scale}: {products} products, {sales} sales -> {path}', file=sys.stderr)
+        datagen.generate(path + '.tmp', products, sales, seed)
+        os.replace(path + '.tmp', path)
+    return path, products
+
+
+def run_scale(data_dir, scale, seed, repeat, budget, only):
+    cached, products = seeded_db(data_dir, scale, seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, 'bench.db')
+        shutil.copyfile(cached, work)
+        core.close_conns()
+        core.DB_FILE = work
+        # a database seeded by an older checkout still needs the newer migrations
+        core.init_db()
+        for name, fn in benchmarks(products, tmp):
+            if only and name not in only:
+                continue
+            results[name] = time_fn(fn, repeat, budget)
+            r = results[name]
+            print(f'{scale:<8} {name:<24} median {r["median_ms"]:10.3f} ms  min {r["min_ms"]:10.3f} ms  ({r["runs"]} runs)')
+        core.close_conns()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scale, benches in results.items():
+        for name, r in benches.items():
+            base = baseline.get('results', {}).get(scale, {}).get(name)
+            if base and r['median_ms'] > base['median_ms'] * (1 + tolerance):
+                regressions.append((scale, name, base['median_ms'], r['median_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inventory benchmark harness')
+    parser.add_argument('--scale', action='append', choices=datagen.SCALES, help='repeatable, default: small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20, help='max iterations per benchmark')
+    parser.add_argument('--budget', type=float, default=5.0, help='seconds per benchmark before stopping early')
+    parser.add_argument('--only', action='append', help='run just these benchmarks, repeatable')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'inventory-bench'))
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON from an earlier --output run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown vs baseline (fraction)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {}
+    for scale in args.scale or ['small']:
+        results[scale] = run_scale(args.data_dir, scale, args.seed, args.repeat, args.budget, args.only)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': core.sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for scale, name, before, after in regressions:
+            print(f'REGRESSION {scale} {name}: {before:.3f} ms -> {after:.3f} ms', file=sys.stderr)
+        if regressions:
+            return 1
+        print('no regressions beyond tolerance', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
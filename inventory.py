@@ -0,0 +1,297 @@
+"""Command-line interface to the inventory database.
+
+    python inventory.py [--db inventory.db] <command> ...
+
+Run with -h for the list of commands. Only the GUI-free core is imported,
+so this works over SSH and from cron.
+"""
+import argparse
+import logging
+import sys
+import time
+
+import inventory_core as core
+import inventory_trace
+
+
+def cmd_init(args):
+    print(f'schema version {core.schema_version()}')
+
+
+def cmd_import(args):
+    imported, rejects = core.import_products_csv(args.file, upsert=not args.no_upsert, atomic=not args.chunked)
+    for line, reason in rejects:
+        print(f'line {line}: {reason}', file=sys.stderr)
+    print(f'imported {imported}, rejected {len(rejects)}')
+    return 1 if rejects and args.strict else 0
+
+
+def cmd_export(args):
+    compress = True if args.gzip else None
+    if args.what == 'products':
+        count, rate = core.export_products_csv(args.file, compress=compress)
+    else:
+        count, rate = core.export_sales_csv(args.file, args.start, args.end, args.product or None, compress=compress)
+    print(f'exported {count} rows ({rate:.0f} rows/sec)')
+
+
+def cmd_sell(args):
+    ok, err = core.record_sale(args.product_id, args.quantity)
+    if not ok:
+        print(err, file=sys.stderr)
+        return 1
+    print('sale recorded')
+
+
+def cmd_restock(args):
+    if not core.get_product(args.product_id):
+        print('Product not found', file=sys.stderr)
+        return 1
+    core.restock_product(args.product_id, args.quantity)
+    print('product restocked')
+
+
+def cmd_low_stock(args):
+    for r in core.get_low_stock():
+        print(f"{r['id']}\t{r['sku'] or ''}\t{r['name']}\tqty={r['quantity']}\tmin={r['min_quantity']}")
+
+
+def cmd_analytics(args):
+    import inventory_analytics as analytics
+    options = {k: v for k, v in (('lead_time', args.lead_time), ('service_level', args.service_level)) if v is not None}
+    analysis = analytics.analyze(args.start, args.end, **options)
+    print(f'sales {analysis.start} to {analysis.end} ({analysis.days} days), {len(analysis)} products', file=sys.stderr)
+    if args.report == 'abc':
+        for cls, s in analysis.abc_summary().items():
+            print(f"{cls}\t{s['products']}\t{s['revenue']:.2f}\t{s['share']:.1%}")
+        return
+    if args.report == 'reorder':
+        changes = analysis.reorder_changes()
+        for pid, minimum in changes[:args.limit]:
+            print(f'{pid}\tmin={minimum}')
+        if args.apply:
+            print(f'updated {analytics.apply_reorder_points(changes)} products')
+        return
+    rows = analysis.top_sellers(args.limit, args.by) if args.report == 'top' else analysis.low_stock(args.limit)
+    for r in rows:
+        cover = '-' if r['days_of_cover'] is None else r['days_of_cover']
+        print(f"{r['id']}\t{r['sku'] or ''}\t{r['name']}\tqty={r['quantity']}\tmin={r['min_quantity']}\t"
+              f"reorder={r['reorder_point']}\tper_day={r['velocity']}\tcover={cover}\tunits={r['units']}\t"
+              f"revenue={r['revenue']:.2f}\t{r['abc']}")
+
+
+def cmd_summary(args):
+    for r in core.sales_rollup(args.period, args.product, args.start, args.end):
+        print(f"{r['period']}\t{r['units']}\t{r['revenue']:.2f}")
+
+
+def cmd_rollup(args):
+    if args.action == 'rebuild':
+        core.rebuild_daily_sales()
+    problems = core.verify_daily_sales()
+    for day, pid, expected, actual in problems:
+        print(f'{day} product {pid}: expected {expected}, found {actual}', file=sys.stderr)
+    print('rollup ok' if not problems else f'{len(problems)} rollup rows differ')
+    return 1 if problems else 0
+
+
+def cmd_archive(args):
+    if args.action == 'run':
+        if not args.before:
+            print('archive run needs --before', file=sys.stderr)
+            return 2
+        moved = core.archive_sales(args.before, args.batch,
+                                   progress=lambda n: print(f'moved {n}', end='\r', file=sys.stderr))
+        print(f'archived {moved} sales before {args.before}')
+    elif args.action == 'compact':
+        print(f'reclaimed {core.compact() / 1e6:.1f} MB')
+    for r in core.sales_archives():
+        print(f"{r['year']}\t{r['path']}\t{r['rows']}\t{r['first_sold_at']}\t{r['last_sold_at']}")
+
+
+def _print_backup(m):
+    print(f"{m['path']}\t{m['bytes'] / 1e6:.1f} MB\t{m['seconds']:.2f} s\t"
+          f"longest step {m['max_step_ms']:.1f} ms\t{len(m['files'])} file(s)")
+
+
+def cmd_backup(args):
+    if args.dir:
+        core.BACKUP_DIR = args.dir
+    if args.action == 'list':
+        for m in core.list_backups():
+            _print_backup(m)
+    elif args.action == 'restore':
+        if not args.path:
+            print('backup restore needs a snapshot path', file=sys.stderr)
+            return 2
+        m = core.restore_database(args.path, safety_copy=not args.no_safety_copy)
+        print(f"restored {m['created']} in {m['restore_seconds']:.2f} s")
+    else:
+        while True:
+            m = core.backup_database(args.label, keep=args.keep, pages=args.pages)
+            _print_backup(m)
+            for f in m['files']:
+                print(f"  {f['file']}: {f['mb_per_sec']} MB/s, {f['steps']} steps, {f['restarts']} restarts, "
+                      f"longest step {f['max_step_ms']} ms, integrity {f['integrity']}")
+            if not args.every:
+                break
+            time.sleep(args.every * 60)
+
+
+def cmd_coordinator(args):
+    import inventory_coordinator
+    print(f'coordinating writes to {args.db}; Ctrl+C to stop', file=sys.stderr)
+    stats = inventory_coordinator.serve(args.db, args.group_max, args.wait_ms)
+    print(f"{stats['requests']} writes in {stats['commits']} commits (mean group {stats['mean_group']}, "
+          f"largest {stats['largest_group']})")
+
+
+def cmd_stock(args):
+    if args.action == 'at':
+        if args.product:
+            print(core.stock_at(args.when, args.product))
+        else:
+            for pid, qty in sorted(core.stock_at(args.when).items()):
+                print(f'{pid}\t{qty}')
+    elif args.action == 'history':
+        for r in core.stock_movements(args.product, args.start, args.end):
+            print(f"{r['at']}\t{r['kind']}\t{r['delta']:+d}")
+    elif args.action == 'snapshot':
+        run = core.snapshot_stock()
+        print(f'snapshot run {run}' if run else 'no movements since the last snapshot')
+    else:
+        problems = core.reconcile_stock(fix=args.fix)
+        for pid, qty, ledger in problems:
+            print(f'product {pid}: quantity {qty}, ledger {ledger}', file=sys.stderr)
+        print('ledger matches stock' if not problems else
+              f"{len(problems)} product(s) differ{', ledger corrected' if args.fix else ''}")
+        return 1 if problems and not args.fix else 0
+
+
+def cmd_check_plans(args):
+    failures = core.check_query_plans()
+    for version, sql, plan in failures:
+        print(f'migration {version}: {sql}\n    {plan}', file=sys.stderr)
+    print(f'schema version {core.schema_version()}, {len(failures)} plan check(s) failed')
+    return 1 if failures else 0
+
+
+def cmd_gui(args):
+    from inventory_gui import AdvancedInventoryApp
+    AdvancedInventoryApp().mainloop()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='inventory', description='Inventory database tools')
+    parser.add_argument('--db', default=core.DB_FILE, help='database file (default: %(default)s)')
+    parser.add_argument('--trace', metavar='JSON', help='record query latencies and write them to JSON on exit')
+    parser.add_argument('--slow-ms', type=float, help='log statements slower than this with their query plan')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('init', help='create or upgrade the database')
+    p.set_defaults(func=cmd_init)
+
+    p = sub.add_parser('import', help='import products from CSV')
+    p.add_argument('file')
+    p.add_argument('--no-upsert', action='store_true', help='reject rows whose SKU already exists')
+    p.add_argument('--chunked', action='store_true', help='commit every chunk instead of all-or-nothing')
+    p.add_argument('--strict', action='store_true', help='exit 1 if any row was rejected')
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('export', help='export products or sales to CSV (.gz compresses)')
+    p.add_argument('what', choices=('products', 'sales'))
+    p.add_argument('file')
+    p.add_argument('--start', help='first sold_at to include (sales only)')
+    p.add_argument('--end', help='sold_at to stop before (sales only)')
+    p.add_argument('--product', type=int, action='append', help='product id, repeatable (sales only)')
+    p.add_argument('--gzip', action='store_true', help='compress even without a .gz suffix')
+    p.set_defaults(func=cmd_export)
+
+    for name, func, text in (('sell', cmd_sell, 'record a sale'), ('restock', cmd_restock, 'add stock')):
+        p = sub.add_parser(name, help=text)
+        p.add_argument('product_id', type=int)
+        p.add_argument('quantity', type=int)
+        p.set_defaults(func=func)
+
+    p = sub.add_parser('low-stock', help='list products at or below their minimum')
+    p.set_defaults(func=cmd_low_stock)
+
+    p = sub.add_parser('analytics', help='sales velocity, top sellers, ABC classes and reorder points')
+    p.add_argument('report', choices=('low-stock', 'top', 'abc', 'reorder'))
+    p.add_argument('--start', help='first day of the sales window (default: the last 90 days with sales)')
+    p.add_argument('--end', help='day to stop before')
+    p.add_argument('--lead-time', type=float, help='days from order to delivery (default: 7)')
+    p.add_argument('--service-level', type=float, help='chance of not running out before delivery (default: 0.95)')
+    p.add_argument('--by', choices=('revenue', 'units'), default='revenue', help='ranking for top')
+    p.add_argument('--limit', type=int, default=20)
+    p.add_argument('--apply', action='store_true', help='reorder: write the suggested min quantities')
+    p.set_defaults(func=cmd_analytics)
+
+    p = sub.add_parser('summary', help='sales totals from the daily rollup')
+    p.add_argument('--period', choices=('day', 'week', 'month', 'year'), default='day')
+    p.add_argument('--product', type=int)
+    p.add_argument('--start')
+    p.add_argument('--end')
+    p.set_defaults(func=cmd_summary)
+
+    p = sub.add_parser('rollup', help='verify or rebuild the daily sales rollup')
+    p.add_argument('action', choices=('verify', 'rebuild'))
+    p.set_defaults(func=cmd_rollup)
+
+    p = sub.add_parser('archive', help='move old sales to per-year archive files, list them or compact the live file')
+    p.add_argument('action', choices=('run', 'list', 'compact'))
+    p.add_argument('--before', help='run: archive sales sold before this date')
+    p.add_argument('--batch', type=int, default=core.ARCHIVE_BATCH_SIZE, help='run: rows moved per transaction')
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser('backup', help='take, list or restore online snapshots')
+    p.add_argument('action', choices=('create', 'list', 'restore'))
+    p.add_argument('path', nargs='?', help='restore: snapshot folder')
+    p.add_argument('--dir', help='snapshot folder (default: backups/ next to the database)')
+    p.add_argument('--keep', type=int, default=core.BACKUP_KEEP,
+                   help='create: snapshots with this label to keep (default: %(default)s)')
+    p.add_argument('--label', help='create: added to the folder name; pruning only counts snapshots with the same label')
+    p.add_argument('--pages', type=int, default=core.BACKUP_PAGES_PER_STEP, help='create: pages copied per step')
+    p.add_argument('--every', type=float, help='create: keep running and take a snapshot every N minutes')
+    p.add_argument('--no-safety-copy', action='store_true', help='restore: do not snapshot the current data first')
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser('coordinator', help='serve writes from all terminals on this machine with group commit')
+    p.add_argument('--group-max', type=int, default=256, help='most writes per commit (default: %(default)s)')
+    p.add_argument('--wait-ms', type=float, default=0, help='wait this long for more writes before committing')
+    p.set_defaults(func=cmd_coordinator)
+
+    p = sub.add_parser('stock', help='stock ledger: stock at a time, movement history, snapshots, reconciliation')
+    p.add_argument('action', choices=('at', 'history', 'snapshot', 'reconcile'))
+    p.add_argument('--when', default='9999-12-31', help='at: UTC date or time (default: now)')
+    p.add_argument('--product', type=int, help='at: one product; history: required')
+    p.add_argument('--start')
+    p.add_argument('--end')
+    p.add_argument('--fix', action='store_true', help='reconcile: log movements so the ledger matches stock')
+    p.set_defaults(func=cmd_stock)
+
+    p = sub.add_parser('check-plans', help='check the hot queries use their indexes')
+    p.set_defaults(func=cmd_check_plans)
+
+    p = sub.add_parser('gui', help='open the dashboard')
+    p.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    core.DB_FILE = args.db
+    if args.trace:
+        logging.basicConfig(format='%(name)s: %(message)s')
+        core.enable_tracing(args.slow_ms)
+    core.init_db()
+    try:
+        return args.func(args) or 0
+    finally:
+        core.close_conns()
+        if args.trace:
+            inventory_trace.dump(args.trace)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Sales analytics over NumPy columns: velocity, top sellers, ABC classes and reorder points.
+
+Sales are read from the database in chunks into flat arrays, then every
+per-product figure is computed with bincount/argsort instead of Python loops,
+so a window over millions of sales rows stays interactive.
+
+    analysis = analyze()              # last ANALYTICS_WINDOW_DAYS of sales
+    analysis.low_stock()              # rows for the Low Stock Report
+    analysis.top_sellers(20)
+"""
+import datetime
+from statistics import NormalDist
+
+import numpy as np
+
+import inventory_core as core
+from inventory_trace import traced
+
+ANALYTICS_WINDOW_DAYS = 90
+LEAD_TIME_DAYS = 7
+SERVICE_LEVEL = 0.95
+# cumulative revenue share that closes class A and class B
+ABC_CUTOFFS = (0.8, 0.95)
+FETCH_ROWS = 50000
+# SQLite's default limit on ? parameters is far above this
+_ID_BATCH = 900
+_UNIX_EPOCH_JD = 2440587.5
+
+
+class SalesColumns:
+    """Parallel arrays, one entry per sales row (or per day and product for the rollup)."""
+
+    __slots__ = ('day', 'product_id', 'units', 'revenue')
+
+    def __init__(self, day, product_id, units, revenue):
+        self.day = day
+        self.product_id = product_id
+        self.units = units
+        self.revenue = revenue
+
+    def __len__(self):
+        return len(self.day)
+
+
+def _fetch_columns(queries, chunk_rows):
+    # fetchmany keeps only one chunk of Python tuples alive at a time
+    parts = []
+    for sql, params in queries:
+        cur = core.get_conn().execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            parts.append(np.array(rows, dtype=np.float64))
+        cur.close()
+    data = np.concatenate(parts) if parts else np.empty((0, 4))
+    return SalesColumns(data[:, 0].astype(np.int32), data[:, 1].astype(np.int64), data[:, 2], data[:, 3])
+
+
+@traced
+def load_daily_sales(start, end, chunk_rows=FETCH_ROWS):
+    """Per day and product totals from the daily_sales rollup, days as days since 1970-01-01."""
+    return _fetch_columns([(
+        f'SELECT CAST(julianday(day) - {_UNIX_EPOCH_JD} AS INTEGER), product_id, units, revenue '
+        'FROM daily_sales WHERE day >= ? AND day < ?', (start, end))], chunk_rows)
+
+
+@traced
+def load_sales(start, end, chunk_rows=FETCH_ROWS):
+    """Individual sales rows, archived ones included; deleted products come back as product id 0.
+
+    Call outside a transaction when the window may reach more archive years
+    than SQLite can attach at once.
+    """
+    return _fetch_columns(((
+        f'SELECT CAST(julianday(date(sold_at)) - {_UNIX_EPOCH_JD} AS INTEGER), ifnull(product_id, 0), '
+        f'quantity, total_price FROM {sales} WHERE sold_at >= ? AND sold_at < ?', (start, end))
+        for sales in core.sales_sources(core.get_conn(), start, end)), chunk_rows)
+
+
+def _per_day(cols):
+    # several sales of one product on one day become a single row, as in daily_sales
+    key = cols.product_id * 65536 + (cols.day - cols.day.min() if len(cols) else 0)
+    uniq, inverse = np.unique(key, return_inverse=True)
+    first = np.zeros(len(uniq), dtype=np.int64)
+    first[inverse] = np.arange(len(key))
+    return SalesColumns(cols.day[first], cols.product_id[first],
+                        np.bincount(inverse, weights=cols.units, minlength=len(uniq)),
+                        np.bincount(inverse, weights=cols.revenue, minlength=len(uniq)))
+
+
+def default_window(days=ANALYTICS_WINDOW_DAYS):
+    """(start, end) covering the last `days` days that have sales, end exclusive."""
+    last = core.get_conn().execute('SELECT max(day) FROM daily_sales').fetchone()[0]
+    end = datetime.date.fromisoformat(last) + datetime.timedelta(days=1) if last else datetime.date.today()
+    return (end - datetime.timedelta(days=days)).isoformat(), end.isoformat()
+
+
+class StockAnalysis:
+    """Per-product arrays aligned with `ids` (all products, ordered by id)."""
+
+    def __init__(self, start, end, days, ids, quantity, min_quantity, units, revenue, velocity, demand_std,
+                 reorder_point, abc):
+        self.start = start
+        self.end = end
+        self.days = days
+        self.ids = ids
+        self.quantity = quantity
+        self.min_quantity = min_quantity
+        self.units = units
+        self.revenue = revenue
+        self.velocity = velocity
+        self.demand_std = demand_std
+        self.reorder_point = reorder_point
+        self.abc = abc
+        with np.errstate(divide='ignore'):
+            self.days_of_cover = np.where(velocity > 0, quantity / np.where(velocity > 0, velocity, 1), np.inf)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, index):
+        """Report rows for the given positions, in that order."""
+        index = np.asarray(index, dtype=np.int64)
+        names = _product_names(self.ids[index].tolist())
+        out = []
+        for i in index.tolist():
+            pid = int(self.ids[i])
+            sku, name = names.get(pid, (None, ''))
+            cover = float(self.days_of_cover[i])
+            out.append({
+                'id': pid, 'sku': sku, 'name': name,
+                'quantity': int(self.quantity[i]), 'min_quantity': int(self.min_quantity[i]),
+                'units': int(self.units[i]), 'revenue': round(float(self.revenue[i]), 2),
+                'velocity': round(float(self.velocity[i]), 3),
+                'reorder_point': int(self.reorder_point[i]),
+                'days_of_cover': None if cover == np.inf else round(cover, 1),
+                'abc': str(self.abc[i]),
+            })
+        return out
+
+    def top_sellers(self, n=10, by='revenue'):
+        values = {'revenue': self.revenue, 'units': self.units}[by]
+        n = min(n, len(values))
+        if not n:
+            return []
+        top = np.argpartition(-values, n - 1)[:n]
+        top = top[np.argsort(-values[top], kind='stable')]
+        return self.rows(top[values[top] > 0])
+
+    def low_stock(self, limit=None):
+        """Products at or below the larger of min_quantity and the reorder point, soonest to run out first."""
+        hit = np.flatnonzero(self.quantity <= np.maximum(self.min_quantity, self.reorder_point))
+        order = np.lexsort((self.quantity[hit], self.days_of_cover[hit]))
+        return self.rows(hit[order][:limit])
+
+    def abc_summary(self):
+        total = self.revenue.sum()
+        summary = {}
+        for cls in 'ABC':
+            mask = self.abc == cls
+            summary[cls] = {
+                'products': int(mask.sum()),
+                'revenue': round(float(self.revenue[mask].sum()), 2),
+                'share': round(float(self.revenue[mask].sum() / total), 3) if total else 0.0,
+            }
+        return summary
+
+    def reorder_changes(self):
+        """(product_id, suggested min_quantity) for products with sales whose minimum differs."""
+        idx = np.flatnonzero((self.units > 0) & (self.reorder_point != self.min_quantity))
+        return list(zip(self.ids[idx].tolist(), self.reorder_point[idx].tolist()))
+
+
+def _product_names(ids):
+    conn = core.get_conn()
+    names = {}
+    for i in range(0, len(ids), _ID_BATCH):
+        batch = ids[i:i + _ID_BATCH]
+        for pid, sku, name in conn.execute(
+                f"SELECT id, sku, name FROM products WHERE id IN ({','.join('?' * len(batch))})", batch):
+            names[pid] = (sku, name)
+    return names
+
+
+def abc_classes(revenue, cutoffs=ABC_CUTOFFS):
+    """'A'/'B'/'C' per entry by share of cumulative revenue, biggest sellers first."""
+    order = np.argsort(-revenue, kind='stable')
+    total = revenue.sum()
+    classes = np.full(len(revenue), 'C', dtype='<U1')
+    if not total:
+        return classes
+    # share of revenue from the products ranked strictly above each one
+    before = (np.cumsum(revenue[order]) - revenue[order]) / total
+    ranked = np.where(before < cutoffs[0], 'A', np.where(before < cutoffs[1], 'B', 'C'))
+    ranked[revenue[order] <= 0] = 'C'
+    classes[order] = ranked
+    return classes
+
+
+@traced
+def analyze(start=None, end=None, lead_time=LEAD_TIME_DAYS, service_level=SERVICE_LEVEL, source='rollup'):
+    """Velocity, demand spread, ABC class and reorder point for every product.
+
+    start/end are ISO dates (end exclusive); without them the window is the
+    last ANALYTICS_WINDOW_DAYS days with sales. source='sales' reads the raw
+    sales table instead of the daily_sales rollup.
+    """
+    if start is None or end is None:
+        default_start, default_end = default_window()
+        start = start or default_start
+        end = end or default_end
+    days = max((datetime.date.fromisoformat(end[:10]) - datetime.date.fromisoformat(start[:10])).days, 1)
+    if source != 'rollup':
+        # a window over many archive years takes several reads, which cannot share the snapshot below
+        cols = _per_day(load_sales(start, end))
+    with core.transaction(immediate=False) as conn:
+        # one snapshot, so stock levels and sales agree
+        products = np.array(conn.execute('SELECT id, quantity, min_quantity FROM products ORDER BY id').fetchall(),
+                            dtype=np.int64).reshape(-1, 3)
+        if source == 'rollup':
+            cols = load_daily_sales(start, end)
+    ids, quantity, min_quantity = products[:, 0], products[:, 1], products[:, 2]
+    n = len(ids)
+
+    pos = np.searchsorted(ids, cols.product_id)
+    known = pos < n
+    known[known] = ids[pos[known]] == cols.product_id[known]
+    pos, units, revenue = pos[known], cols.units[known], cols.revenue[known]
+
+    total_units = np.bincount(pos, weights=units, minlength=n)
+    total_revenue = np.bincount(pos, weights=revenue, minlength=n)
+    # days without a sale count as zero demand, so their squares add nothing
+    velocity = total_units / days
+    variance = np.maximum(np.bincount(pos, weights=units * units, minlength=n) / days - velocity ** 2, 0)
+    demand_std = np.sqrt(variance)
+
+    z = NormalDist().inv_cdf(service_level)
+    reorder_point = np.ceil(velocity * lead_time + z * demand_std * np.sqrt(lead_time)).astype(np.int64)
+    return StockAnalysis(start, end, days, ids, quantity, min_quantity, total_units, total_revenue, velocity,
+                         demand_std, reorder_point, abc_classes(total_revenue))
+
+
+@traced
+def low_stock_report(limit=None, **kwargs):
+    return analyze(**kwargs).low_stock(limit)
+
+
+@traced
+def apply_reorder_points(changes):
+    """Write suggested min_quantity values from StockAnalysis.reorder_changes(); returns the number applied."""
+    with core.transaction() as conn:
+        conn.executemany('UPDATE products SET min_quantity=? WHERE id=?', [(m, pid) for pid, m in changes])
+    return len(changes)
@@ -0,0 +1,244 @@
+"""Optional single-writer process that group-commits writes from several terminals.
+
+    python inventory.py --db inventory.db coordinator
+
+While it runs, add_product, update_product, delete_product, record_sales
+(and so record_sale), restock_product and record_stocktake in every process on this machine
+send their call over a local socket instead of writing themselves. The
+coordinator runs all calls that arrived together in one transaction, each
+in its own savepoint, so terminals stop queueing on the write lock and a
+batch of N writes pays for one commit. When it is not running the same
+functions write directly, as before, and so do calls made inside the
+caller's own transaction(), which already holds the write lock.
+"""
+import os
+import json
+import time
+import queue
+import secrets
+import threading
+from multiprocessing.connection import Client, Listener
+
+import inventory_core as core
+
+# largest number of calls committed together
+GROUP_MAX = 256
+# how long to wait for more calls after the first one; 0 only takes what is queued
+GROUP_WAIT_MS = 0
+# after a failed connect, write directly for this long before trying again
+RETRY_SECONDS = 5.0
+OPERATIONS = ('add_product', 'update_product', 'delete_product', 'record_sales', 'record_sale', 'restock_product',
+              'record_stocktake')
+
+
+class CoordinatorLost(ConnectionError):
+    """The coordinator went away after a call was sent; whether it was committed is unknown."""
+
+
+_local = threading.local()
+_down_until = {}
+
+
+def _client(path):
+    conn = getattr(_local, 'clients', {}).get(path)
+    if conn is not None:
+        return conn
+    if _down_until.get(path, 0) > time.monotonic():
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            info = json.load(f)
+        conn = Client(info['address'], authkey=bytes.fromhex(info['authkey']))
+    except (OSError, ValueError, KeyError, EOFError):
+        # a file left behind by a coordinator that did not shut down cleanly
+        _down_until[path] = time.monotonic() + RETRY_SECONDS
+        return None
+    if not hasattr(_local, 'clients'):
+        _local.clients = {}
+    _local.clients[path] = conn
+    return conn
+
+
+def _drop(path):
+    conn = _local.clients.pop(path, None)
+    if conn is not None:
+        conn.close()
+    _down_until[path] = time.monotonic() + RETRY_SECONDS
+
+
+def forward(op, args, kwargs):
+    """Send one write to the coordinator for core.DB_FILE; returns (handled, result).
+
+    handled is False when no coordinator answers, and the caller writes
+    directly. Exceptions raised by the call are re-raised here.
+    """
+    path = core.coordinator_file()
+    conn = _client(path)
+    if conn is None:
+        return False, None
+    try:
+        conn.send((op, args, kwargs))
+    except OSError:
+        _drop(path)
+        return False, None
+    try:
+        ok, value = conn.recv()
+    except (OSError, EOFError) as e:
+        _drop(path)
+        raise CoordinatorLost(f'write coordinator stopped during {op}') from e
+    if not ok:
+        raise value
+    return True, value
+
+
+class _Request:
+    __slots__ = ('op', 'args', 'kwargs', 'done', 'ok', 'value')
+
+    def __init__(self, op, args, kwargs):
+        self.op = op
+        self.args = args
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+class Coordinator:
+    """Accepts write calls from local clients and group-commits them on one connection."""
+
+    def __init__(self, db_file=None, group_max=GROUP_MAX, group_wait_ms=GROUP_WAIT_MS):
+        if db_file:
+            core.DB_FILE = db_file
+        # this process is the writer; its own calls must not loop back to it
+        core.USE_COORDINATOR = False
+        self.group_max = group_max
+        self.group_wait = group_wait_ms / 1000
+        self.path = core.coordinator_file()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._listener = None
+        self._authkey = None
+        self.commits = 0
+        self.requests = 0
+        self.largest_group = 0
+        self.started = time.perf_counter()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'requests': self.requests,
+            'commits': self.commits,
+            'mean_group': round(self.requests / self.commits, 2) if self.commits else 0.0,
+            'largest_group': self.largest_group,
+            'commits_per_sec': round(self.commits / elapsed, 1) if elapsed else 0.0,
+            'requests_per_sec': round(self.requests / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def serve_forever(self):
+        if os.path.exists(self.path) and _client(self.path) is not None:
+            raise RuntimeError(f'a write coordinator is already running for {core.DB_FILE}')
+        self._authkey = authkey = secrets.token_bytes(32)
+        self._listener = Listener(authkey=authkey)
+        # readable by this user only: the key is all a client needs to write
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'address': self._listener.address, 'authkey': authkey.hex(), 'pid': os.getpid()}, f)
+        writer = threading.Thread(target=self._write_loop, name='coordinator-writer', daemon=True)
+        writer.start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    if self._stop.is_set():
+                        break
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self.stop()
+            writer.join(timeout=5)
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._queue.put(None)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        if self._listener is not None:
+            try:
+                # wake accept() in serve_forever
+                Client(self._listener.address, authkey=self._authkey).close()
+            except OSError:
+                pass
+            self._listener.close()
+
+    def _serve_client(self, conn):
+        # one thread per terminal connection; each client waits for its reply before sending again
+        try:
+            while not self._stop.is_set():
+                op, args, kwargs = conn.recv()
+                if op not in OPERATIONS:
+                    conn.send((False, ValueError(f'unknown operation {op!r}')))
+                    continue
+                req = _Request(op, args, kwargs)
+                self._queue.put(req)
+                req.done.wait()
+                conn.send((req.ok, req.value))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _next_group(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        group = [first]
+        deadline = time.perf_counter() + self.group_wait
+        while len(group) < self.group_max:
+            try:
+                req = self._queue.get(timeout=max(deadline - time.perf_counter(), 0)) if self.group_wait else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is None:
+                self._queue.put(None)
+                break
+            group.append(req)
+        return group
+
+    def _write_loop(self):
+        while True:
+            group = self._next_group()
+            if group is None:
+                return
+            try:
+                with core.transaction():
+                    for req in group:
+                        try:
+                            # nested transaction(): a failing call rolls back to its savepoint only
+                            req.value = getattr(core, req.op)(*req.args, **req.kwargs)
+                            req.ok = True
+                        except Exception as e:
+                            req.value = e
+            except Exception as e:
+                # the commit itself failed, so nothing in the group was written
+                for req in group:
+                    req.ok, req.value = False, e
+            self.commits += 1
+            self.requests += len(group)
+            self.largest_group = max(self.largest_group, len(group))
+            for req in group:
+                req.done.set()
+
+
+def serve(db_file=None, group_max=GROUP_MAX, group_wait_ms=GROUP_WAIT_MS):
+    """Run a coordinator for db_file (default core.DB_FILE) until interrupted; returns its stats."""
+    coordinator = Coordinator(db_file, group_max, group_wait_ms)
+    try:
+        coordinator.serve_forever()
+    except KeyboardInterrupt:
+        coordinator.stop()
+    return coordinator.stats()
@@ -0,0 +1,1824 @@
+"""Inventory data layer: schema, queries, import/export and accounts.
+
+Nothing here imports tkinter or matplotlib, so scripts and the inventory CLI
+can use it without a display.
+"""
+import os
+import re
+import sqlite3
+import hashlib
+import hmac
+import binascii
+import csv
+import gzip
+import json
+import shutil
+import datetime
+import time
+import threading
+import contextlib
+import functools
+import unicodedata
+from collections import OrderedDict
+
+import inventory_trace
+from inventory_trace import traced
+
+
+DB_FILE = 'inventory.db'
+# only used to verify hashes from before per-user salts
+SALT = b'some_static_salt_change_it'
+PASSWORD_ALGORITHM = 'sha256'
+PASSWORD_ITERATIONS = 600000
+PASSWORD_SALT_BYTES = 16
+
+# connection tuning, applied once when a pooled connection is opened
+JOURNAL_MODE = 'WAL'
+PRAGMAS = (
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+BUSY_TIMEOUT = 30.0
+STATEMENT_CACHE_SIZE = 256
+# products kept by get_product()/get_product_by_sku(); 0 disables the cache
+PRODUCT_CACHE_SIZE = 4096
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = []
+_generation = 0
+
+
+def _open_conn(path):
+    # autocommit mode: transaction() issues BEGIN/COMMIT explicitly
+    factory = inventory_trace.TracedConnection if inventory_trace.enabled else sqlite3.Connection
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, factory=factory,
+                           check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    if JOURNAL_MODE:
+        conn.execute(f'PRAGMA journal_mode={JOURNAL_MODE}')
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def get_conn():
+    """Return this thread's long-lived connection to DB_FILE, opening it on first use.
+
+    Connections are reopened if DB_FILE changed, the process was forked or
+    tracing was toggled. Callers must not close the returned connection; use
+    close_conns() instead.
+    """
+    key = (os.getpid(), DB_FILE, _generation)
+    old_key = getattr(_local, 'key', None)
+    if old_key != key:
+        if old_key is not None and old_key[0] == key[0]:
+            old = _local.conn
+            try:
+                busy = old.in_transaction
+            except sqlite3.ProgrammingError:
+                # already closed by close_conns()
+                busy = False
+            # never swap connections under an open transaction
+            if busy and old_key[1] == key[1]:
+                return old
+            with _pool_lock:
+                if old in _pool:
+                    _pool.remove(old)
+            old.close()
+        conn = _open_conn(DB_FILE)
+        with _pool_lock:
+            _pool.append(conn)
+        _local.key = key
+        _local.conn = conn
+    return _local.conn
+
+
+def close_conns():
+    global _generation
+    with _pool_lock:
+        conns = list(_pool)
+        _pool.clear()
+        _generation += 1
+    for c in conns:
+        try:
+            c.close()
+        except sqlite3.Error:
+            pass
+
+
+def enable_tracing(slow_ms=None):
+    """Start recording latencies; each thread switches to a traced connection on its next call."""
+    global _generation
+    inventory_trace.enable(slow_ms)
+    with _pool_lock:
+        _generation += 1
+
+
+def disable_tracing():
+    global _generation
+    inventory_trace.disable()
+    with _pool_lock:
+        _generation += 1
+
+
+@contextlib.contextmanager
+def transaction(immediate=True):
+    """Group several statements into one transaction on the pooled connection.
+
+    Nested use joins the outer transaction as a savepoint, so a failing inner
+    block undoes only its own statements. Writers take the write lock up front
+    (BEGIN IMMEDIATE) so concurrent terminals wait on busy_timeout instead of
+    failing on lock upgrade.
+    """
+    conn = get_conn()
+    if conn.in_transaction:
+        conn.execute('SAVEPOINT nested')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK TO nested')
+            conn.execute('RELEASE nested')
+            raise
+        conn.execute('RELEASE nested')
+        return
+    changes = conn.total_changes
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        # this connection's own commits do not move its data_version
+        if conn.total_changes != changes:
+            _product_cache.clear()
+
+
+# with a coordinator running (python inventory.py coordinator) the write functions
+# below hand their calls to it; set to False to always write directly
+USE_COORDINATOR = True
+
+
+def coordinator_file():
+    """Where a running write coordinator for DB_FILE publishes its address."""
+    return os.path.abspath(DB_FILE) + '.coordinator'
+
+
+def _coordinated(fn):
+    # run by the coordinator when one serves DB_FILE, else here as usual; calls
+    # inside the caller's own transaction() stay here, as that already holds the write lock
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if USE_COORDINATOR and os.path.exists(coordinator_file()) and not get_conn().in_transaction:
+            import inventory_coordinator
+            handled, result = inventory_coordinator.forward(fn.__name__, args, kwargs)
+            if handled:
+                return result
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def _legacy_hash(password):
+    dk = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), SALT, 100000)
+    return binascii.hexlify(dk).decode('ascii')
+
+
+def hash_password(password: str, iterations: int = None, salt: bytes = None) -> str:
+    """Hash with a fresh per-user salt into 'pbkdf2_<algorithm>$<iterations>$<salt hex>$<hash hex>'."""
+    iterations = iterations or PASSWORD_ITERATIONS
+    salt = salt or os.urandom(PASSWORD_SALT_BYTES)
+    dk = hashlib.pbkdf2_hmac(PASSWORD_ALGORITHM, password.encode('utf-8'), salt, iterations)
+    return f'pbkdf2_{PASSWORD_ALGORITHM}${iterations}${salt.hex()}${dk.hex()}'
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    if '$' not in stored_hash:
+        # hashes written before the self-describing format used the static SALT
+        return hmac.compare_digest(_legacy_hash(password), stored_hash)
+    try:
+        scheme, iterations, salt, expected = stored_hash.split('$')
+        algorithm = scheme[len('pbkdf2_'):]
+        dk = hashlib.pbkdf2_hmac(algorithm, password.encode('utf-8'), bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(dk.hex(), expected)
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    return not stored_hash.startswith(f'pbkdf2_{PASSWORD_ALGORITHM}${PASSWORD_ITERATIONS}$')
+
+
+
+_fts5 = None
+
+
+def fts5_available():
+    global _fts5
+    if _fts5 is None:
+        probe = sqlite3.connect(':memory:')
+        try:
+            probe.execute('CREATE VIRTUAL TABLE t USING fts5(x)')
+            _fts5 = True
+        except sqlite3.OperationalError:
+            _fts5 = False
+        finally:
+            probe.close()
+    return _fts5
+
+
+def _create_product_fts(conn):
+    # external-content index over products, kept in sync by triggers; skipped
+    # when this SQLite has no FTS5 and get_products() falls back to LIKE
+    if not fts5_available():
+        return
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+                 "name, sku, description, content='products', content_rowid='id', "
+                 "tokenize='unicode61 remove_diacritics 2')")
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description);
+    END''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku, description) VALUES ('delete', old.id, old.name, old.sku, old.description);
+    END''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, sku, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku, description) VALUES ('delete', old.id, old.name, old.sku, old.description);
+        INSERT INTO products_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description);
+    END''')
+    conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+# the migration that adds products_fts
+_FTS_VERSION = 2
+_FTS_TRIGGERS = ('products_fts_ai', 'products_fts_ad', 'products_fts_au')
+
+
+def _sync_product_fts(conn):
+    # the index follows what this SQLite supports: migrating on a build without
+    # FTS5 leaves it out, so it is created (and rebuilt) once FTS5 is there; a
+    # build without FTS5 cannot run the triggers, so it drops them to keep
+    # products writable and a later FTS5 build rebuilds the then stale index
+    present = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE name IN ('products_fts', ?, ?, ?)",
+                                          _FTS_TRIGGERS)}
+    if fts5_available():
+        if len(present) < len(_FTS_TRIGGERS) + 1:
+            _create_product_fts(conn)
+    else:
+        for name in present.intersection(_FTS_TRIGGERS):
+            conn.execute(f'DROP TRIGGER {name}')
+
+
+def _roll_up_sales(conn, sales):
+    # sales are (product_id, quantity, total_price, sold_at) rows just inserted into sales
+    conn.executemany('INSERT INTO daily_sales (day, product_id, units, revenue) VALUES (?, ?, ?, ?) '
+                     'ON CONFLICT(day, product_id) DO UPDATE SET units = units + excluded.units, revenue = revenue + excluded.revenue',
+                     [(sold_at[:10], pid, qty, total) for pid, qty, total, sold_at in sales])
+
+
+_ROLLUP_FROM_SALES = ('SELECT date(sold_at) AS day, ifnull(product_id, 0) AS product_id, SUM(quantity) AS units, '
+                      'SUM(total_price) AS revenue FROM {sales} GROUP BY day, ifnull(product_id, 0)')
+
+
+def _backfill_daily_sales(conn):
+    conn.execute('DELETE FROM daily_sales')
+    conn.execute('INSERT INTO daily_sales (day, product_id, units, revenue) ' + _ROLLUP_FROM_SALES.format(sales=sales_source(conn)))
+
+
+@traced
+def rebuild_daily_sales():
+    conn = get_conn()
+    older = []
+    for parts in _sales_groups(conn):
+        if parts[-1][0] != 'main.sales':
+            # archive years past the attachment limit are summed up front
+            with transaction(immediate=False):
+                older.extend(conn.execute(_ROLLUP_FROM_SALES.format(sales=_union_sales(parts))).fetchall())
+            continue
+        with transaction():
+            conn.execute('DELETE FROM daily_sales')
+            conn.execute('INSERT INTO daily_sales (day, product_id, units, revenue) '
+                         + _ROLLUP_FROM_SALES.format(sales=_union_sales(parts)))
+            conn.executemany('INSERT INTO daily_sales (day, product_id, units, revenue) VALUES (?, ?, ?, ?) '
+                             'ON CONFLICT (day, product_id) DO UPDATE SET units = units + excluded.units, '
+                             'revenue = revenue + excluded.revenue', older)
+
+
+@traced
+def verify_daily_sales():
+    """Compare daily_sales with a fresh aggregate of sales.
+
+    Returns a list of (day, product_id, expected, actual) where expected/actual
+    are (units, revenue) tuples, or None for a missing row.
+    """
+    conn = get_conn()
+    expected = {}
+    for parts in _sales_groups(conn):
+        with transaction(immediate=False):
+            for r in conn.execute(_ROLLUP_FROM_SALES.format(sales=_union_sales(parts))):
+                units, revenue = expected.get((r['day'], r['product_id']), (0, 0.0))
+                expected[r['day'], r['product_id']] = (units + r['units'], revenue + r['revenue'])
+            if parts[-1][0] == 'main.sales':
+                actual = {(r['day'], r['product_id']): (r['units'], r['revenue'])
+                          for r in conn.execute('SELECT * FROM daily_sales')}
+    problems = []
+    for key in sorted(expected.keys() | actual.keys()):
+        exp, act = expected.get(key), actual.get(key)
+        if exp is None or act is None or exp[0] != act[0] or abs(exp[1] - act[1]) > 1e-6:
+            problems.append((key[0], key[1], exp, act))
+    return problems
+
+
+# Schema migrations, applied in order by migrate() and tracked in PRAGMA user_version.
+# Each entry is (version, description, steps, plan_checks): steps are SQL strings or
+# callables taking the connection; plan_checks are (sql, params, index) tuples that
+# check_query_plans() uses to confirm the hot queries use the expected index.
+MIGRATIONS = [
+    (1, 'indexes for sales reporting, product listing and low stock', [
+        'CREATE INDEX IF NOT EXISTS idx_sales_sold_at ON sales(sold_at)',
+        'CREATE INDEX IF NOT EXISTS idx_sales_product_id ON sales(product_id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)',
+        'CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products(quantity) WHERE quantity <= min_quantity',
+    ], [
+        ('SELECT s.id, p.name, s.quantity, s.total_price, s.sold_at FROM sales s LEFT JOIN products p ON p.id = s.product_id ORDER BY s.sold_at', (), 'idx_sales_sold_at'),
+        ('SELECT * FROM sales WHERE product_id = ?', (1,), 'idx_sales_product_id'),
+        ('SELECT * FROM products ORDER BY name', (), 'idx_products_name'),
+        ('SELECT * FROM products WHERE quantity <= min_quantity ORDER BY quantity', (), 'idx_products_low_stock'),
+    ]),
+    (_FTS_VERSION, 'full-text product search', [_create_product_fts], []),
+    (3, 'indexes for keyset pagination by price and quantity', [
+        'CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)',
+        'CREATE INDEX IF NOT EXISTS idx_products_quantity ON products(quantity)',
+    ], [
+        ('SELECT * FROM products WHERE (price, id) > (?, ?) ORDER BY price, id LIMIT 200', (1.0, 1), 'idx_products_price'),
+        ('SELECT * FROM products WHERE (quantity, id) < (?, ?) ORDER BY quantity DESC, id DESC LIMIT 200', (1, 1), 'idx_products_quantity'),
+        ('SELECT * FROM products WHERE (name, id) > (?, ?) ORDER BY name, id LIMIT 200', ('a', 1), 'idx_products_name'),
+        ('SELECT * FROM products WHERE sku IS NOT NULL AND (sku, id) > (?, ?) ORDER BY sku, id LIMIT 200', ('a', 1), 'sqlite_autoindex_products_1'),
+    ]),
+    (4, 'product change log for incremental refresh', [
+        'CREATE TABLE IF NOT EXISTS product_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, product_id INTEGER NOT NULL)',
+        'CREATE TRIGGER IF NOT EXISTS product_changes_ai AFTER INSERT ON products BEGIN INSERT INTO product_changes (product_id) VALUES (new.id); END',
+        'CREATE TRIGGER IF NOT EXISTS product_changes_au AFTER UPDATE ON products BEGIN INSERT INTO product_changes (product_id) VALUES (new.id); END',
+        'CREATE TRIGGER IF NOT EXISTS product_changes_ad AFTER DELETE ON products BEGIN INSERT INTO product_changes (product_id) VALUES (old.id); END',
+    ], []),
+    (5, 'daily sales rollup', [
+        'CREATE TABLE IF NOT EXISTS daily_sales (day TEXT NOT NULL, product_id INTEGER NOT NULL, '
+        'units INTEGER NOT NULL, revenue REAL NOT NULL, PRIMARY KEY (day, product_id)) WITHOUT ROWID',
+        'CREATE INDEX IF NOT EXISTS idx_daily_sales_product ON daily_sales(product_id, day)',
+        _backfill_daily_sales,
+    ], [
+        ('SELECT day, SUM(revenue) FROM daily_sales WHERE day >= ? GROUP BY day', ('2000-01-01',), 'PRIMARY KEY'),
+        ('SELECT day, SUM(revenue) FROM daily_sales WHERE product_id = ? GROUP BY day', (1,), 'idx_daily_sales_product'),
+    ]),
+    (6, 'registry of per-year sales archives', [
+        'CREATE TABLE IF NOT EXISTS sales_archives (year INTEGER PRIMARY KEY, path TEXT NOT NULL, '
+        'rows INTEGER NOT NULL DEFAULT 0, first_sold_at TEXT, last_sold_at TEXT, archived_at TEXT)',
+    ], [
+        ('SELECT id, sold_at FROM sales WHERE sold_at < ? AND id < (SELECT max(id) FROM sales) ORDER BY sold_at LIMIT 5000',
+         ('2000-01-01',), 'idx_sales_sold_at'),
+    ]),
+    (7, 'append-only stock movement ledger with snapshots', [
+        'CREATE TABLE IF NOT EXISTS stock_movements (id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, '
+        "delta INTEGER NOT NULL, kind TEXT NOT NULL, at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')))",
+        'CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements(product_id, id)',
+        "CREATE TRIGGER IF NOT EXISTS stock_movements_no_update BEFORE UPDATE ON stock_movements "
+        "BEGIN SELECT RAISE(ABORT, 'stock_movements is append-only'); END",
+        "CREATE TRIGGER IF NOT EXISTS stock_movements_no_delete BEFORE DELETE ON stock_movements "
+        "BEGIN SELECT RAISE(ABORT, 'stock_movements is append-only'); END",
+        'CREATE TABLE IF NOT EXISTS stock_snapshot_runs (id INTEGER PRIMARY KEY, '
+        "taken_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')), movement_id INTEGER NOT NULL)",
+        'CREATE TABLE IF NOT EXISTS stock_snapshots (product_id INTEGER NOT NULL, run_id INTEGER NOT NULL, '
+        'quantity INTEGER NOT NULL, PRIMARY KEY (product_id, run_id)) WITHOUT ROWID',
+        # stock from before the ledger existed becomes an opening balance
+        "INSERT INTO stock_movements (product_id, delta, kind) SELECT id, quantity, 'opening' FROM products WHERE quantity != 0",
+    ], [
+        ('SELECT ifnull(SUM(delta), 0) FROM stock_movements WHERE product_id = ? AND id > ? AND at <= ?', (1, 0, '9999'),
+         'idx_stock_movements_product'),
+        ('SELECT quantity FROM stock_snapshots WHERE product_id = ? AND run_id <= ? ORDER BY run_id DESC LIMIT 1', (1, 1),
+         'PRIMARY KEY'),
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn=None):
+    return (conn or get_conn()).execute('PRAGMA user_version').fetchone()[0]
+
+
+@traced
+def migrate(target=None):
+    """Upgrade the database in place to target (default: latest) and return the new version."""
+    target = SCHEMA_VERSION if target is None else target
+    for version, _, steps, _ in MIGRATIONS:
+        if version > target:
+            break
+        with transaction() as conn:
+            # re-read under the write lock in case another terminal migrated first
+            if schema_version(conn) >= version:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {version:d}')
+    if schema_version() >= _FTS_VERSION:
+        with transaction() as conn:
+            _sync_product_fts(conn)
+    return schema_version()
+
+
+def explain(sql, params=()):
+    return [r['detail'] for r in get_conn().execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def check_query_plans(version=None):
+    """Return a list of (version, sql, plan) for plan checks that do not use their index."""
+    current = schema_version() if version is None else version
+    failures = []
+    for v, _, _, checks in MIGRATIONS:
+        if v > current:
+            break
+        for sql, params, index in checks:
+            plan = explain(sql, params)
+            if not any(index in detail for detail in plan):
+                failures.append((v, sql, plan))
+    return failures
+
+
+def _create_base_schema(conn):
+    # tables and the admin account from before schema versioning; MIGRATIONS builds on them
+    cur = conn.cursor()
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL
+    )
+    ''')
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY,
+        sku TEXT UNIQUE,
+        name TEXT NOT NULL,
+        description TEXT,
+        price REAL NOT NULL DEFAULT 0,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        min_quantity INTEGER NOT NULL DEFAULT 5
+    )
+    ''')
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY,
+        product_id INTEGER,
+        quantity INTEGER,
+        total_price REAL,
+        sold_at TEXT,
+        FOREIGN KEY(product_id) REFERENCES products(id)
+    )
+    ''')
+    cur.execute('SELECT * FROM users WHERE username = ?', ('admin',))
+    if not cur.fetchone():
+        pw = hash_password('admin123')
+        cur.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', ('admin', pw))
+
+
+@traced
+def init_db():
+    with transaction() as conn:
+        _create_base_schema(conn)
+    migrate()
+    prune_product_changes()
+    maybe_snapshot_stock()
+
+
+@traced
+def add_user(username, password):
+    try:
+        with transaction() as conn:
+            conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, hash_password(password)))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def get_user(username):
+    return get_conn().execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+
+
+@traced
+def authenticate(username, password):
+    """Check a login and upgrade the stored hash if the cost settings changed since it was written."""
+    row = get_user(username)
+    if not row or not verify_password(password, row['password_hash']):
+        return False
+    if needs_rehash(row['password_hash']):
+        with transaction() as conn:
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                         (hash_password(password), row['id'], row['password_hash']))
+    return True
+
+
+def _hash_credentials(pair):
+    return pair[0], hash_password(pair[1])
+
+
+@traced
+def add_users(credentials, processes=None):
+    """Create many (username, password) accounts, hashing in a process pool.
+
+    Returns the usernames that were skipped because they already exist.
+    """
+    # multiprocessing is slow to import and only needed here
+    from concurrent.futures import ProcessPoolExecutor
+    credentials = list(credentials)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        hashed = list(pool.map(_hash_credentials, credentials, chunksize=max(1, len(credentials) // 64)))
+    skipped = []
+    with transaction() as conn:
+        for username, pw_hash in hashed:
+            try:
+                conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, pw_hash))
+            except sqlite3.IntegrityError:
+                skipped.append(username)
+    return skipped
+
+
+@traced
+@_coordinated
+def add_product(sku, name, description, price, quantity, min_quantity):
+    try:
+        with transaction() as conn:
+            cur = conn.execute('INSERT INTO products (sku,name,description,price,quantity,min_quantity) VALUES (?, ?, ?, ?, ?, ?)',
+                               (sku or None, name, description, price, quantity, min_quantity))
+            _log_movements(conn, 'create', [(cur.lastrowid, quantity)])
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+@traced
+@_coordinated
+def update_product(pid, sku, name, description, price, quantity, min_quantity):
+    with transaction() as conn:
+        old = conn.execute('SELECT quantity FROM products WHERE id=?', (pid,)).fetchone()
+        conn.execute('UPDATE products SET sku=?,name=?,description=?,price=?,quantity=?,min_quantity=? WHERE id=?',
+                     (sku or None, name, description, price, quantity, min_quantity, pid))
+        if old:
+            _log_movements(conn, 'adjust', [(pid, quantity - old[0])])
+
+
+@traced
+@_coordinated
+def delete_product(pid):
+    with transaction() as conn:
+        old = conn.execute('SELECT quantity FROM products WHERE id=?', (pid,)).fetchone()
+        conn.execute('DELETE FROM products WHERE id=?', (pid,))
+        if old:
+            _log_movements(conn, 'delete', [(pid, -old[0])])
+
+
+SEARCH_LIMIT = 500
+# bm25 column weights for name, sku, description
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def _fts_query(search):
+    # every whitespace-separated term becomes a quoted prefix phrase, ANDed together
+    terms = search.split()
+    return ' '.join('"{}"*'.format(t.replace('"', '""')) for t in terms)
+
+
+def _has_product_fts(conn):
+    if not fts5_available():
+        return False
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'").fetchone() is not None
+
+
+@traced
+def get_products(search=None, limit=None):
+    """Return products ordered by name, or by relevance when searching.
+
+    Searches use the FTS5 index (prefix match on every term, bm25 ranked) and
+    fall back to a LIKE scan when FTS5 is unavailable. limit=None means no limit.
+    """
+    conn = get_conn()
+    limit = -1 if limit is None else limit
+    if search:
+        return _search_products(conn, search, limit)[0]
+    return conn.execute('SELECT * FROM products ORDER BY name LIMIT ?', (limit,)).fetchall()
+
+
+def _search_products(conn, search, limit):
+    # (rows, fts): fts says whether the index or the LIKE fallback matched them
+    if _has_product_fts(conn) and search.split():
+        try:
+            return conn.execute('SELECT p.* FROM products_fts JOIN products p ON p.id = products_fts.rowid '
+                                'WHERE products_fts MATCH ? ORDER BY bm25(products_fts, ?, ?, ?) LIMIT ?',
+                                (_fts_query(search), *FTS_WEIGHTS, limit)).fetchall(), True
+        except sqlite3.OperationalError as e:
+            if str(e) == 'interrupted':
+                raise
+    q = f"%{search}%"
+    return conn.execute('SELECT * FROM products WHERE name LIKE ? OR sku LIKE ? ORDER BY name LIMIT ?',
+                        (q, q, limit)).fetchall(), False
+
+
+# search-as-you-type: result sets kept per query text for narrowing
+SEARCH_CACHE_SIZE = 32
+# SQLite VM steps between checks for a newer search
+SEARCH_CHECK_STEPS = 1000
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+def _fts_tokens(text):
+    # the unicode61 tokenizer: runs of letters and digits, lower-cased, accents removed
+    text = unicodedata.normalize('NFD', text.lower())
+    return _TOKEN_RE.findall(''.join(c for c in text if not unicodedata.combining(c)))
+
+
+def _narrow(rows, search, fts):
+    """rows that search would match, using the same rules as _search_products; None if they cannot be mirrored."""
+    if fts:
+        phrases = [_fts_tokens(term) for term in search.split()]
+        if not all(phrases):
+            # a term with no letters or digits; let FTS5 decide what it means
+            return None
+
+        def match(r):
+            columns = [_fts_tokens(r[c] or '') for c in ('name', 'sku', 'description')]
+            for *head, last in phrases:
+                n = len(head)
+                if not any(tokens[i:i + n] == head and tokens[i + n].startswith(last)
+                           for tokens in columns for i in range(len(tokens) - n)):
+                    return False
+            return True
+    else:
+        if '%' in search or '_' in search:
+            return None
+        # LIKE is case-insensitive for ASCII letters only
+        q = search.translate(_ASCII_LOWER)
+
+        def match(r):
+            return q in r['name'].translate(_ASCII_LOWER) or q in (r['sku'] or '').translate(_ASCII_LOWER)
+    return [r for r in rows if match(r)]
+
+
+class ProductSearch:
+    """Search-as-you-type for one search box, safe to call from worker threads.
+
+    Each search() supersedes the ones before it: a query still running for an
+    older search is aborted from SQLite's progress handler and that call
+    returns None. Results are cached by text; when the text extends a cached
+    query whose results were not cut off by the limit, the cached rows are
+    filtered in memory instead of querying again (they keep that query's
+    ranking). A new entry in product_changes empties the cache.
+    """
+
+    def __init__(self, limit=SEARCH_LIMIT, cache_size=SEARCH_CACHE_SIZE):
+        self.limit = limit
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._seq = None
+        self._ticket = 0
+        self.queries = self.hits = self.narrowed = self.interrupted = 0
+
+    def search(self, search):
+        """Return (change seq, rows) for search, or None if a newer search() started meanwhile."""
+        with self._lock:
+            self._ticket += 1
+            ticket = self._ticket
+        with transaction(immediate=False) as conn:
+            seq = last_change_seq()
+            fts = _has_product_fts(conn)
+            with self._lock:
+                if seq != self._seq:
+                    self._cache.clear()
+                    self._seq = seq
+                rows = self._cached(search, fts)
+            if rows is not None:
+                return seq, rows
+            conn.set_progress_handler(lambda: self._ticket != ticket, SEARCH_CHECK_STEPS)
+            try:
+                rows, fts = _search_products(conn, search, self.limit)
+            except sqlite3.OperationalError as e:
+                if str(e) != 'interrupted' or self._ticket == ticket:
+                    raise
+                with self._lock:
+                    self.interrupted += 1
+                return None
+            finally:
+                conn.set_progress_handler(None, 0)
+            with self._lock:
+                self.queries += 1
+                if seq == self._seq:
+                    self._store(search, rows, fts, len(rows) < self.limit)
+        return None if self._ticket != ticket else (seq, rows)
+
+    def _cached(self, search, fts):
+        hit = self._cache.get(search)
+        if hit is not None:
+            self._cache.move_to_end(search)
+            self.hits += 1
+            return hit[0]
+        # the longest cached prefix with every match in it
+        for n in range(len(search) - 1, 0, -1):
+            hit = self._cache.get(search[:n])
+            if hit is None or not hit[2] or hit[1] != fts:
+                continue
+            rows = _narrow(hit[0], search, hit[1])
+            if rows is not None:
+                self.narrowed += 1
+                self._store(search, rows, hit[1], True)
+                return rows
+        return None
+
+    def _store(self, search, rows, fts, complete):
+        self._cache[search] = (rows, fts, complete)
+        self._cache.move_to_end(search)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._seq = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'queries': self.queries,
+                'hits': self.hits,
+                'narrowed': self.narrowed,
+                'interrupted': self.interrupted,
+            }
+
+
+PAGE_SIZE = 200
+PRODUCT_SORT_COLUMNS = ('id', 'sku', 'name', 'price', 'quantity')
+
+
+def _product_seek(col, ascending, key, limit, nulls=None):
+    conn = get_conn()
+    d = 'ASC' if ascending else 'DESC'
+    op = '>' if ascending else '<'
+    where, params = [], []
+    if nulls is not None:
+        where.append(f'{col} IS NULL' if nulls else f'{col} IS NOT NULL')
+    if key is not None:
+        if col == 'id' or nulls:
+            where.append(f'id {op} ?')
+            params.append(key[1])
+        else:
+            where.append(f'({col}, id) {op} (?, ?)')
+            params.extend(key)
+    sql = 'SELECT * FROM products'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    order = f'id {d}' if col == 'id' or nulls else f'{col} {d}, id {d}'
+    return conn.execute(f'{sql} ORDER BY {order} LIMIT ?', params + [limit]).fetchall()
+
+
+@traced
+def get_products_page(order='name', descending=False, after=None, before=None, limit=PAGE_SIZE):
+    """Keyset (seek) pagination over products ordered by (order, id).
+
+    after/before are the (value, id) keys of the last/first row already shown;
+    pass neither for the first page. Rows always come back in display order.
+    """
+    if order not in PRODUCT_SORT_COLUMNS:
+        raise ValueError(f'cannot sort products by {order!r}')
+    key = before if before is not None else after
+    # scanning backwards from `before` runs against the display order
+    ascending = descending if before is not None else not descending
+    if order != 'sku':
+        rows = _product_seek(order, ascending, key, limit)
+    else:
+        # sku is nullable and NULLs sort first; (sku, id) row values never match
+        # NULL, so read the NULL block and the non-NULL block as separate seeks
+        in_nulls = key is not None and key[0] is None
+        if ascending:
+            segments = [(False, key)] if key is not None and not in_nulls else [(True, key), (False, None)]
+        else:
+            segments = [(True, key)] if in_nulls else [(False, key), (True, None)]
+        rows = []
+        for nulls, seg_key in segments:
+            rows.extend(_product_seek(order, ascending, seg_key, limit - len(rows), nulls))
+            if len(rows) >= limit:
+                break
+    if before is not None:
+        rows.reverse()
+    return rows
+
+
+CHANGE_LOG_KEEP = 100000
+
+
+def last_change_seq():
+    return get_conn().execute('SELECT ifnull(max(seq), 0) FROM product_changes').fetchone()[0]
+
+
+@traced
+def get_product_changes(since, limit=None):
+    """Return (seq, rows, deleted_ids) for products changed after change sequence since.
+
+    Returns None when the caller has to reload everything instead: since predates
+    the pruned change log, is ahead of it (an older snapshot was restored), or
+    more than limit products changed.
+    """
+    with transaction(immediate=False) as conn:
+        oldest, seq = conn.execute('SELECT min(seq), max(seq) FROM product_changes').fetchone()
+        seq = seq or 0
+        if seq == since:
+            return since, [], []
+        if seq < since or since < oldest - 1:
+            return None
+        ids = [r[0] for r in conn.execute('SELECT DISTINCT product_id FROM product_changes WHERE seq > ? AND seq <= ?', (since, seq))]
+        if limit is not None and len(ids) > limit:
+            return None
+        rows = []
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            rows.extend(conn.execute(f"SELECT * FROM products WHERE id IN ({','.join('?' * len(part))})", part))
+    found = {r['id'] for r in rows}
+    return seq, rows, [pid for pid in ids if pid not in found]
+
+
+def prune_product_changes(keep=CHANGE_LOG_KEEP):
+    with transaction() as conn:
+        conn.execute('DELETE FROM product_changes WHERE seq <= (SELECT max(seq) FROM product_changes) - ?', (keep,))
+
+
+class ProductRecord:
+    """Compact read-only product row; supports r['name'] and r[2] like sqlite3.Row."""
+
+    __slots__ = ('id', 'sku', 'name', 'description', 'price', 'quantity', 'min_quantity')
+
+    def __init__(self, row):
+        for field, value in zip(self.__slots__, row):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ProductRecord is read-only')
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self.__slots__:
+                raise IndexError(f'No item with that key: {key}')
+            return getattr(self, key)
+        return getattr(self, self.__slots__[key])
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __iter__(self):
+        return (getattr(self, f) for f in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, ProductRecord) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f'ProductRecord(id={self.id!r}, sku={self.sku!r}, name={self.name!r}, quantity={self.quantity!r})'
+
+    def keys(self):
+        return list(self.__slots__)
+
+
+_PRODUCT_COLUMNS = ', '.join(ProductRecord.__slots__)
+
+
+class ProductCache:
+    """Bounded LRU of ProductRecord keyed by id, with a SKU index.
+
+    Every lookup first compares the calling connection's PRAGMA data_version
+    with the last one it saw; a change means another connection (thread or
+    process) committed, and the whole cache is dropped. Commits on the same
+    connection do not move data_version, so transaction() calls clear()
+    after any write. Loads that raced with a clear are not stored, and neither
+    are loads inside a transaction, whose snapshot may predate the last commit.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._by_id = OrderedDict()
+        self._by_sku = {}
+        self._gen = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_sku.clear()
+            self._gen += 1
+            self.invalidations += 1
+
+    def _validate(self, conn):
+        seen = (_local.key, conn.execute('PRAGMA data_version').fetchone()[0])
+        if getattr(_local, 'cache_seen', None) != seen:
+            # also covers a new thread, fork or DB_FILE switch: no common history
+            self.clear()
+            _local.cache_seen = seen
+
+    def _lookup(self, conn, where, value, index):
+        if self.size <= 0:
+            row = conn.execute(f'SELECT {_PRODUCT_COLUMNS} FROM products WHERE {where}=?', (value,)).fetchone()
+            return ProductRecord(row) if row else None
+        self._validate(conn)
+        with self._lock:
+            pid = value if index is None else index.get(value)
+            rec = self._by_id.get(pid)
+            if rec is not None:
+                self._by_id.move_to_end(pid)
+                self.hits += 1
+                return rec
+            self.misses += 1
+            gen = self._gen
+        row = conn.execute(f'SELECT {_PRODUCT_COLUMNS} FROM products WHERE {where}=?', (value,)).fetchone()
+        if not row:
+            return None
+        rec = ProductRecord(row)
+        if conn.in_transaction:
+            return rec
+        with self._lock:
+            if gen == self._gen:
+                self._by_id[rec.id] = rec
+                if rec.sku is not None:
+                    self._by_sku[rec.sku] = rec.id
+                while len(self._by_id) > self.size:
+                    _, old = self._by_id.popitem(last=False)
+                    self._by_sku.pop(old.sku, None)
+                    self.evictions += 1
+        return rec
+
+    def get(self, pid):
+        return self._lookup(get_conn(), 'id', pid, None)
+
+    def get_by_sku(self, sku):
+        return self._lookup(get_conn(), 'sku', sku, self._by_sku)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._by_id),
+                'capacity': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_product_cache = ProductCache(PRODUCT_CACHE_SIZE)
+
+
+@traced
+def get_product(pid):
+    return _product_cache.get(pid)
+
+
+@traced
+def get_product_by_sku(sku):
+    return _product_cache.get_by_sku(sku)
+
+
+def product_cache_stats():
+    return _product_cache.stats()
+
+
+class _SaleRejected(Exception):
+    pass
+
+
+def _sale_failure(lines):
+    # called after the rollback, only to explain which line could not be sold
+    needed = {}
+    for pid, qty in lines:
+        needed[pid] = needed.get(pid, 0) + qty
+    for pid, qty in needed.items():
+        row = get_conn().execute('SELECT quantity FROM products WHERE id=?', (pid,)).fetchone()
+        suffix = f' (product {pid})' if len(needed) > 1 else ''
+        if not row:
+            return 'Product not found' + suffix
+        if row['quantity'] < qty:
+            return 'Insufficient stock' + suffix
+    return 'Stock changed during sale, try again'
+
+
+@traced
+@_coordinated
+def record_sales(items):
+    """Record a basket of (product_id, quantity) lines as one all-or-nothing sale.
+
+    Stock is taken with a conditional UPDATE per line, so concurrent terminals can
+    never oversell. Returns (True, None), or (False, reason) with nothing written.
+    """
+    lines = [(int(pid), int(qty)) for pid, qty in items]
+    if not lines:
+        return True, None
+    if any(qty <= 0 for _, qty in lines):
+        return False, 'Quantity must be positive'
+    sold_at = datetime.datetime.utcnow().isoformat()
+    try:
+        with transaction() as conn:
+            cur = conn.executemany('UPDATE products SET quantity = quantity - ? WHERE id = ? AND quantity >= ?',
+                                   [(qty, pid, qty) for pid, qty in lines])
+            if cur.rowcount != len(lines):
+                raise _SaleRejected()
+            ids = sorted({pid for pid, _ in lines})
+            prices = dict(conn.execute(f"SELECT id, price FROM products WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall())
+            sales = [(pid, qty, qty * prices[pid], sold_at) for pid, qty in lines]
+            conn.executemany('INSERT INTO sales (product_id, quantity, total_price, sold_at) VALUES (?, ?, ?, ?)', sales)
+            _roll_up_sales(conn, sales)
+            _log_movements(conn, 'sale', [(pid, -qty) for pid, qty in lines])
+    except _SaleRejected:
+        return False, _sale_failure(lines)
+    return True, None
+
+
+@traced
+def record_sale(product_id, quantity):
+    return record_sales([(product_id, quantity)])
+
+
+@traced
+@_coordinated
+def restock_product(product_id, quantity):
+    with transaction() as conn:
+        if conn.execute('UPDATE products SET quantity = quantity + ? WHERE id = ?', (quantity, product_id)).rowcount:
+            _log_movements(conn, 'restock', [(product_id, quantity)])
+
+
+@traced
+def get_low_stock():
+    return get_conn().execute('SELECT * FROM products WHERE quantity <= min_quantity ORDER BY quantity').fetchall()
+
+
+# Every change to products.quantity is also appended to stock_movements in the
+# same transaction. stock_snapshot_runs/stock_snapshots hold the ledger totals
+# of products that moved since the previous run, so stock at any moment is the
+# nearest run plus the movements after it.
+STOCK_SNAPSHOT_HOURS = 24
+STOCK_SNAPSHOT_MOVEMENTS = 50000
+MOVEMENT_KINDS = ('opening', 'create', 'sale', 'restock', 'adjust', 'stocktake', 'import', 'delete', 'reconcile')
+
+
+def _log_movements(conn, kind, changes):
+    # changes are (product_id, delta) pairs; one row per product, zero deltas dropped
+    if kind not in MOVEMENT_KINDS:
+        raise ValueError(f'unknown stock movement kind {kind!r}')
+    totals = {}
+    for pid, delta in changes:
+        totals[pid] = totals.get(pid, 0) + delta
+    conn.executemany('INSERT INTO stock_movements (product_id, delta, kind) VALUES (?, ?, ?)',
+                     [(pid, delta, kind) for pid, delta in totals.items() if delta])
+
+
+@traced
+@_coordinated
+def record_stocktake(counts):
+    """Set stock to counted quantities, {product_id: counted}; returns {product_id: delta} for what changed."""
+    with transaction() as conn:
+        changes = {}
+        for pid, counted in counts.items():
+            row = conn.execute('SELECT quantity FROM products WHERE id = ?', (pid,)).fetchone()
+            if row and row[0] != counted:
+                changes[pid] = counted - row[0]
+        conn.executemany('UPDATE products SET quantity = quantity + ? WHERE id = ?', [(d, pid) for pid, d in changes.items()])
+        _log_movements(conn, 'stocktake', changes.items())
+    return changes
+
+
+@traced
+def snapshot_stock():
+    """Record ledger totals for products that moved since the last run; returns the run id, or None if nothing moved."""
+    with transaction() as conn:
+        last = conn.execute('SELECT id, movement_id FROM stock_snapshot_runs ORDER BY id DESC LIMIT 1').fetchone()
+        since = last['movement_id'] if last else 0
+        through = conn.execute('SELECT ifnull(max(id), 0) FROM stock_movements').fetchone()[0]
+        if through == since:
+            return None
+        run = conn.execute('INSERT INTO stock_snapshot_runs (movement_id) VALUES (?)', (through,)).lastrowid
+        conn.execute(
+            'INSERT INTO stock_snapshots (product_id, run_id, quantity) '
+            'SELECT d.product_id, ?, d.delta + ifnull((SELECT s.quantity FROM stock_snapshots s WHERE s.product_id = d.product_id '
+            'ORDER BY s.run_id DESC LIMIT 1), 0) '
+            'FROM (SELECT product_id, SUM(delta) AS delta FROM stock_movements WHERE id > ? AND id <= ? GROUP BY product_id) d',
+            (run, since, through))
+    return run
+
+
+def maybe_snapshot_stock(hours=STOCK_SNAPSHOT_HOURS, movements=STOCK_SNAPSHOT_MOVEMENTS):
+    """Take a snapshot if the last one is older than hours or movements have been logged since."""
+    conn = get_conn()
+    last = conn.execute('SELECT taken_at, movement_id FROM stock_snapshot_runs ORDER BY id DESC LIMIT 1').fetchone()
+    through = conn.execute('SELECT ifnull(max(id), 0) FROM stock_movements').fetchone()[0]
+    if last is not None:
+        age = datetime.datetime.utcnow() - datetime.datetime.fromisoformat(last['taken_at'])
+        if through - last['movement_id'] < movements and age < datetime.timedelta(hours=hours):
+            return None
+    return snapshot_stock()
+
+
+@traced
+def stock_at(when, product_id=None):
+    """Stock as recorded by the ledger at when (UTC, like sold_at).
+
+    Returns the quantity of product_id, or {product_id: quantity} for every
+    product that ever had a movement. Only movements after the nearest
+    snapshot run are scanned.
+    """
+    when = _iso(when)
+    with transaction(immediate=False) as conn:
+        run = conn.execute('SELECT id, movement_id FROM stock_snapshot_runs WHERE taken_at <= ? ORDER BY id DESC LIMIT 1',
+                           (when,)).fetchone()
+        run_id, since = (run['id'], run['movement_id']) if run else (0, 0)
+        if product_id is not None:
+            base = conn.execute('SELECT quantity FROM stock_snapshots WHERE product_id = ? AND run_id <= ? ORDER BY run_id DESC LIMIT 1',
+                                (product_id, run_id)).fetchone()
+            delta = conn.execute('SELECT ifnull(SUM(delta), 0) FROM stock_movements WHERE product_id = ? AND id > ? AND at <= ?',
+                                 (product_id, since, when)).fetchone()[0]
+            return (base[0] if base else 0) + delta
+        # bare column with max(): quantity comes from each product's latest run
+        stock = {pid: qty for pid, qty, _ in conn.execute(
+            'SELECT product_id, quantity, max(run_id) FROM stock_snapshots WHERE run_id <= ? GROUP BY product_id', (run_id,))}
+        for pid, delta in conn.execute('SELECT product_id, SUM(delta) FROM stock_movements WHERE id > ? AND at <= ? '
+                                       'GROUP BY product_id', (since, when)):
+            stock[pid] = stock.get(pid, 0) + delta
+    return stock
+
+
+@traced
+def stock_movements(product_id, start=None, end=None, limit=None):
+    """(id, delta, kind, at) ledger rows of one product, oldest first, optionally start <= at < end."""
+    where, params = ['product_id = ?'], [product_id]
+    if start is not None:
+        where.append('at >= ?')
+        params.append(_iso(start))
+    if end is not None:
+        where.append('at < ?')
+        params.append(_iso(end))
+    sql = f"SELECT id, delta, kind, at FROM stock_movements WHERE {' AND '.join(where)} ORDER BY id"
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+    return get_conn().execute(sql, params).fetchall()
+
+
+@traced
+def reconcile_stock(fix=False):
+    """Compare products.quantity with the ledger; returns (product_id, quantity, ledger) for each mismatch.
+
+    Deleted products count as quantity 0. With fix, a 'reconcile' movement is
+    logged for each so the ledger agrees with the products table again.
+    """
+    with transaction(immediate=fix) as conn:
+        ledger = stock_at('9999-12-31')
+        actual = dict(conn.execute('SELECT id, quantity FROM products').fetchall())
+        # a deleted product should have been moved to zero
+        problems = [(pid, actual.get(pid, 0), ledger.get(pid, 0)) for pid in sorted(actual.keys() | ledger.keys())
+                    if actual.get(pid, 0) != ledger.get(pid, 0)]
+        if fix:
+            _log_movements(conn, 'reconcile', [(pid, qty - led) for pid, qty, led in problems])
+    return problems
+
+
+# Sales older than a cutoff can be moved to one database file per year next to
+# DB_FILE. The live file keeps a sales_archives registry; queries over sales
+# attach the archives their date range reaches and union them with main.sales.
+# daily_sales always covers the full history, so rollup reports never need them.
+ARCHIVE_NAME = '{stem}-sales-{year}.db'
+ARCHIVE_BATCH_SIZE = 5000
+COMPACT_STEP_PAGES = 2000
+_SALES_COLUMNS = 'id, product_id, quantity, total_price, sold_at'
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _archive_dir():
+    return os.path.dirname(os.path.abspath(DB_FILE))
+
+
+def _archive_years(conn, start=None, end=None):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sales_archives'").fetchone():
+        return []
+    start, end = _iso(start), _iso(end)
+    return [r[0] for r in conn.execute(
+        'SELECT year FROM sales_archives WHERE rows > 0 AND (? IS NULL OR last_sold_at >= ?) '
+        'AND (? IS NULL OR first_sold_at < ?) ORDER BY year', (start, start, end, end))]
+
+
+def _attach_archives(conn, years):
+    """Attach the archives for years on conn if needed; returns their schema names in the same order."""
+    attached = {r[1] for r in conn.execute('PRAGMA database_list')}
+    wanted = [f'sales_{year}' for year in years]
+    if not conn.in_transaction:
+        # SQLite allows only a few attachments per connection; drop ones this query does not use
+        for name in attached - set(wanted) - {'main', 'temp'}:
+            conn.execute(f'DETACH DATABASE {name}')
+        attached &= set(wanted) | {'main', 'temp'}
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len((attached | set(wanted)) - {'main', 'temp'}) > limit:
+        raise sqlite3.OperationalError(
+            f'{len(wanted)} sales archives are needed but SQLite attaches at most {limit} databases at once; '
+            'narrow the date range')
+    for year, name in zip(years, wanted):
+        if name not in attached:
+            path = conn.execute('SELECT path FROM sales_archives WHERE year = ?', (year,)).fetchone()[0]
+            conn.execute(f'ATTACH DATABASE ? AS {name}', (os.path.join(_archive_dir(), path),))
+    return wanted
+
+
+# archived rows are copied before they are deleted from main, so an archive
+# branch skips ids still present in main
+_NOT_IN_MAIN = 'NOT EXISTS (SELECT 1 FROM main.sales m WHERE m.id = s.id)'
+
+
+def _sales_partitions(conn, start=None, end=None):
+    """(table, extra condition) pairs covering sales in [start, end), archives oldest first, main last.
+
+    A statement reads main first, which keeps this exact while archive_sales()
+    runs. Raises OperationalError when the range reaches more archives than
+    SQLite can attach at once; _sales_groups() has no such limit.
+    """
+    parts = [(f'{name}.sales', _NOT_IN_MAIN) for name in _attach_archives(conn, _archive_years(conn, start, end))]
+    parts.append(('main.sales', None))
+    return parts
+
+
+def _sales_groups(conn, start=None, end=None):
+    """Yield _sales_partitions() for [start, end) in groups SQLite can attach together.
+
+    Call outside a transaction and read each group in one read transaction
+    before taking the next, which detaches it. main.sales comes in the last
+    group, so with up to SQLITE_LIMIT_ATTACHED archives (10 by default) this is
+    a single exact read. With more, only rows archive_sales() moves into an
+    already read year while this runs can be missed.
+    """
+    years = _archive_years(conn, start, end)
+    size = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    groups = [years[i:i + size] for i in range(0, len(years), size)] or [[]]
+    for n, group in enumerate(groups, 1):
+        parts = [(f'{name}.sales', _NOT_IN_MAIN) for name in _attach_archives(conn, group)]
+        if n == len(groups):
+            parts.append(('main.sales', None))
+        yield parts
+
+
+def _union_sales(parts):
+    if parts == [('main.sales', None)]:
+        return 'main.sales'
+    selects = [f'SELECT {_SALES_COLUMNS} FROM {table} s' + (f' WHERE {cond}' if cond else '') for table, cond in parts]
+    return '(' + ' UNION ALL '.join(selects) + ')'
+
+
+def sales_source(conn, start=None, end=None):
+    """FROM-clause expression for every sale in [start, end), live or archived."""
+    return _union_sales(_sales_partitions(conn, start, end))
+
+
+def sales_sources(conn, start=None, end=None):
+    """Like sales_source() for any number of archives: yields FROM-clause expressions covering [start, end).
+
+    Call outside a transaction. Each expression is queried in a read
+    transaction that lasts until the next one is taken.
+    """
+    for parts in _sales_groups(conn, start, end):
+        with transaction(immediate=False):
+            yield _union_sales(parts)
+
+
+def _open_archive(conn, year):
+    name = ARCHIVE_NAME.format(stem=os.path.splitext(os.path.basename(DB_FILE))[0], year=year)
+    conn.execute('INSERT OR IGNORE INTO sales_archives (year, path) VALUES (?, ?)', (year, name))
+    schema, = _attach_archives(conn, [year])
+    conn.execute(f'PRAGMA {schema}.journal_mode=WAL')
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {schema}.sales (id INTEGER PRIMARY KEY, product_id INTEGER, '
+                 'quantity INTEGER, total_price REAL, sold_at TEXT)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_sales_sold_at ON sales(sold_at)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_sales_product_id ON sales(product_id)')
+    return schema
+
+
+@traced
+def archive_sales(before, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """Move sales with sold_at < before into per-year archive files; returns the number moved.
+
+    Works in short batches, each copied and committed to the archive before it
+    is deleted from the live file, so other terminals keep working and an
+    interrupted run simply continues where it stopped. progress(moved) is called
+    after each batch. Run compact() afterwards to shrink the live file.
+    """
+    before = _iso(before)
+    conn = get_conn()
+    moved = 0
+    while True:
+        # the newest sale always stays so new rows never reuse an archived id
+        batch = conn.execute(
+            'SELECT id, sold_at FROM sales WHERE sold_at < ? AND id < (SELECT max(id) FROM sales) '
+            'ORDER BY sold_at LIMIT ?', (before, batch_size)).fetchall()
+        if not batch:
+            return moved
+        year = batch[0][1][:4]
+        batch = [(pid, sold_at) for pid, sold_at in batch if sold_at[:4] == year]
+        schema = _open_archive(conn, int(year))
+        ids = [(r[0],) for r in batch]
+        with transaction() as conn:
+            conn.executemany(f'INSERT OR IGNORE INTO {schema}.sales ({_SALES_COLUMNS}) '
+                             f'SELECT {_SALES_COLUMNS} FROM main.sales WHERE id = ?', ids)
+        with transaction() as conn:
+            cur = conn.executemany('DELETE FROM main.sales WHERE id = ?', ids)
+            conn.execute('UPDATE sales_archives SET rows = rows + ?, first_sold_at = min(ifnull(first_sold_at, ?), ?), '
+                         'last_sold_at = max(ifnull(last_sold_at, ?), ?), archived_at = ? WHERE year = ?',
+                         (cur.rowcount, batch[0][1], batch[0][1], batch[-1][1], batch[-1][1],
+                          datetime.datetime.now().isoformat(), int(year)))
+        moved += cur.rowcount
+        if progress:
+            progress(moved)
+
+
+def sales_archives():
+    """Registry rows (year, path, rows, first_sold_at, last_sold_at, archived_at), oldest first."""
+    return get_conn().execute('SELECT * FROM sales_archives WHERE rows > 0 ORDER BY year').fetchall()
+
+
+@traced
+def compact(pages_per_step=COMPACT_STEP_PAGES):
+    """Return free pages of the live file to the filesystem; returns bytes reclaimed.
+
+    The first run switches the file to incremental auto-vacuum, which takes one
+    full VACUUM; later runs free pages_per_step pages per transaction so other
+    terminals only wait for one step at a time.
+    """
+    conn = get_conn()
+
+    def size():
+        return sum(os.path.getsize(p) for p in (DB_FILE, DB_FILE + '-wal') if os.path.exists(p))
+
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    start = size()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+    else:
+        while conn.execute('PRAGMA freelist_count').fetchone()[0]:
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages_per_step)})').fetchall()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return start - size()
+
+
+# Backups are consistent snapshots taken with the SQLite online backup API while
+# terminals keep working: one directory per snapshot holding the live file, its
+# sales archives and a manifest.json with the copy metrics.
+BACKUP_DIR = None
+BACKUP_KEEP = 10
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+# a commit from another connection restarts a paged copy; after this many
+# restarts the rest is copied in one step, which in WAL mode does not block writers
+BACKUP_MAX_RESTARTS = 3
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def backup_dir():
+    """Where snapshots go: BACKUP_DIR, or backups/ next to DB_FILE."""
+    return BACKUP_DIR or os.path.join(_archive_dir(), 'backups')
+
+
+def _copy_database(src_path, dest_path, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """Copy one database file with Connection.backup and check the copy; returns its metrics."""
+    started = time.perf_counter()
+    steps = []
+    state = {'last': started, 'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        now = time.perf_counter()
+        # time since the previous step ended, less the pause backup() sleeps between steps
+        steps.append(now - state['last'] - (sleep if steps else 0))
+        state['last'] = now
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] >= BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted
+        state['remaining'] = remaining
+
+    src = sqlite3.connect(src_path, timeout=BUSY_TIMEOUT)
+    dest = sqlite3.connect(dest_path)
+    try:
+        try:
+            src.backup(dest, pages=pages, progress=progress, sleep=sleep)
+        except _BackupRestarted:
+            t = time.perf_counter()
+            src.backup(dest, pages=-1)
+            steps.append(time.perf_counter() - t)
+        check = [r[0] for r in dest.execute('PRAGMA integrity_check')]
+        size = dest.execute('PRAGMA page_count').fetchone()[0] * dest.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        dest.close()
+        src.close()
+    if check != ['ok']:
+        raise sqlite3.DatabaseError(f'backup of {src_path} failed integrity check: {check[:5]}')
+    seconds = time.perf_counter() - started
+    return {
+        'file': os.path.basename(dest_path),
+        'bytes': size,
+        'steps': len(steps),
+        'restarts': state['restarts'],
+        'seconds': round(seconds, 3),
+        'mb_per_sec': round(size / 1e6 / seconds, 1) if seconds else 0.0,
+        'max_step_ms': round(max(steps, default=0) * 1000, 2),
+        'step_ms_total': round(sum(steps) * 1000, 2),
+        'integrity': 'ok',
+    }
+
+
+@traced
+def backup_database(label=None, keep=BACKUP_KEEP, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """Snapshot DB_FILE and its sales archives into a new directory under backup_dir().
+
+    Each file is copied pages at a time and must pass PRAGMA integrity_check;
+    the directory only gets its final name once everything is verified. Older
+    snapshots with the same label beyond keep are removed (keep=None keeps all);
+    'pre-restore' copies are never pruned here. Returns the manifest.
+    """
+    stem = os.path.splitext(os.path.basename(DB_FILE))[0]
+    name = f"{stem}-{datetime.datetime.now():%Y%m%d-%H%M%S}" + (f'-{label}' if label else '')
+    path = os.path.join(backup_dir(), name)
+    n = 1
+    while os.path.exists(path):
+        n += 1
+        path = os.path.join(backup_dir(), f'{name}-{n}')
+    partial = path + '.partial'
+    os.makedirs(partial)
+    started = time.perf_counter()
+    try:
+        # the live file first: anything archive_sales() deleted from it by then is already in its archive
+        files = [_copy_database(DB_FILE, os.path.join(partial, os.path.basename(DB_FILE)), pages, sleep)]
+        for r in sales_archives():
+            files.append(_copy_database(os.path.join(_archive_dir(), r['path']), os.path.join(partial, r['path']), pages, sleep))
+        manifest = {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'database': os.path.basename(DB_FILE),
+            'label': label,
+            'schema_version': schema_version(),
+            'seconds': round(time.perf_counter() - started, 3),
+            'bytes': sum(f['bytes'] for f in files),
+            'max_step_ms': max(f['max_step_ms'] for f in files),
+            'files': files,
+        }
+        with open(os.path.join(partial, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    if keep is not None and label != 'pre-restore':
+        prune_backups(keep, label)
+    manifest['path'] = path
+    return manifest
+
+
+def list_backups():
+    """Manifests of the finished snapshots in backup_dir(), oldest first, each with its 'path'."""
+    root = backup_dir()
+    stem = os.path.splitext(os.path.basename(DB_FILE))[0]
+    found = []
+    if not os.path.isdir(root):
+        return found
+    for name in sorted(os.listdir(root)):
+        manifest_path = os.path.join(root, name, 'manifest.json')
+        if name.startswith(stem + '-') and os.path.isfile(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest['path'] = os.path.join(root, name)
+            # snapshots from before labels were recorded
+            manifest.setdefault('label', 'pre-restore' if '-pre-restore' in name else None)
+            found.append(manifest)
+    found.sort(key=lambda m: m['created'])
+    return found
+
+
+def prune_backups(keep=BACKUP_KEEP, label=None):
+    """Delete all but the newest keep snapshots taken with label; returns the removed paths."""
+    same = [m for m in list_backups() if m['label'] == label]
+    old = same[:-keep] if keep > 0 else same
+    for m in old:
+        # another terminal may be pruning the same snapshot
+        shutil.rmtree(m['path'], ignore_errors=True)
+    return [m['path'] for m in old]
+
+
+@traced
+def restore_database(path, safety_copy=True):
+    """Replace DB_FILE and its archives with the snapshot in path; returns the manifest.
+
+    The snapshot is integrity-checked first and, unless safety_copy is False,
+    the current data is snapshotted as '...-pre-restore'. Other terminals keep
+    their connections and see the restored data on their next query.
+    """
+    with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    for entry in manifest['files']:
+        conn = sqlite3.connect(os.path.join(path, entry['file']))
+        try:
+            check = [r[0] for r in conn.execute('PRAGMA integrity_check')]
+        finally:
+            conn.close()
+        if check != ['ok']:
+            raise sqlite3.DatabaseError(f"snapshot file {entry['file']} failed integrity check: {check[:5]}")
+    if safety_copy:
+        backup_database('pre-restore', keep=None)
+    close_conns()
+    started = time.perf_counter()
+    for i, entry in enumerate(manifest['files']):
+        target = DB_FILE if i == 0 else os.path.join(_archive_dir(), entry['file'])
+        src = sqlite3.connect(os.path.join(path, entry['file']))
+        dest = sqlite3.connect(target, timeout=BUSY_TIMEOUT)
+        try:
+            # one step: the target is locked while it is overwritten
+            src.backup(dest)
+        finally:
+            dest.close()
+            src.close()
+    _product_cache.clear()
+    manifest['restore_seconds'] = round(time.perf_counter() - started, 3)
+    manifest['path'] = path
+    return manifest
+
+
+EXPORT_FETCH_SIZE = 2000
+
+
+def _open_export(path, compress=None):
+    if compress is None:
+        compress = str(path).endswith('.gz')
+    if compress:
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+
+def _write_cursor(path, header, cur, compress=None):
+    # pulls EXPORT_FETCH_SIZE rows at a time so memory stays flat; returns (rows, rows/sec).
+    # cur may also be an iterable of (sql, params), run one after another into the same file
+    start = time.perf_counter()
+    count = 0
+    queries = [cur] if isinstance(cur, (sqlite3.Cursor, tuple)) else cur
+    with _open_export(path, compress) as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for cur in queries:
+            if isinstance(cur, tuple):
+                cur = get_conn().execute(*cur)
+            while True:
+                rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                count += len(rows)
+            cur.close()
+    elapsed = time.perf_counter() - start
+    return count, (count / elapsed if elapsed else 0.0)
+
+
+@traced
+def export_products_csv(path, compress=None):
+    cur = get_conn().execute('SELECT id, sku, name, description, price, quantity, min_quantity FROM products ORDER BY name')
+    return _write_cursor(path, ['id','sku','name','description','price','quantity','min_quantity'], cur, compress)
+
+
+@traced
+def export_sales_csv(path, start=None, end=None, product_ids=None, compress=None):
+    """Stream sales to CSV, optionally limited to start <= sold_at < end and to some products.
+
+    start/end may be dates, datetimes or ISO strings. A path ending in .gz is
+    gzip-compressed unless compress says otherwise. Returns (rows, rows/sec).
+    """
+    where = []
+    params = []
+    if start is not None:
+        where.append('s.sold_at >= ?')
+        params.append(_iso(start))
+    if end is not None:
+        where.append('s.sold_at < ?')
+        params.append(_iso(end))
+    if product_ids is not None:
+        if isinstance(product_ids, int):
+            product_ids = [product_ids]
+        product_ids = list(product_ids)
+        where.append(f"s.product_id IN ({','.join('?' * len(product_ids))})")
+        params.extend(product_ids)
+
+    def queries():
+        # one query per partition, oldest first, so each streams in sold_at index order
+        for parts in _sales_groups(get_conn(), start, end):
+            with transaction(immediate=False):
+                for table, cond in parts:
+                    conds = where + [cond] if cond else where
+                    sql = f'SELECT s.id, p.name, s.quantity, s.total_price, s.sold_at FROM {table} s LEFT JOIN main.products p ON p.id = s.product_id'
+                    if conds:
+                        sql += ' WHERE ' + ' AND '.join(conds)
+                    yield sql + ' ORDER BY s.sold_at', params
+
+    return _write_cursor(path, ['id','product','quantity','total_price','sold_at'], queries(), compress)
+
+
+@traced
+def sales_summary(start=None):
+    where, params = _rollup_filter(None, start, None)
+    return get_conn().execute(f'SELECT day, SUM(revenue) as total FROM daily_sales{where} GROUP BY day ORDER BY day', params).fetchall()
+
+
+_PERIODS = {
+    'day': 'day',
+    'week': "strftime('%Y-W%W', day)",
+    'month': 'substr(day, 1, 7)',
+    'year': 'substr(day, 1, 4)',
+}
+
+
+def _rollup_filter(product_id, start, end):
+    where, params = [], []
+    if product_id is not None:
+        where.append('product_id = ?')
+        params.append(product_id)
+    if start is not None:
+        where.append('day >= ?')
+        params.append(str(start)[:10])
+    if end is not None:
+        where.append('day < ?')
+        params.append(str(end)[:10])
+    return (' WHERE ' + ' AND '.join(where) if where else ''), params
+
+
+@traced
+def sales_rollup(period='day', product_id=None, start=None, end=None):
+    """Return (period, units, revenue) rows from the daily rollup, oldest first.
+
+    period is day, week, month or year; start/end bound the day (end exclusive).
+    """
+    if period not in _PERIODS:
+        raise ValueError(f'unknown period {period!r}')
+    where, params = _rollup_filter(product_id, start, end)
+    expr = _PERIODS[period]
+    return get_conn().execute(f'SELECT {expr} AS period, SUM(units) AS units, SUM(revenue) AS revenue '
+                              f'FROM daily_sales{where} GROUP BY period ORDER BY period', params).fetchall()
+
+
+@traced
+def sales_by_product(start=None, end=None):
+    """Return (product_id, units, revenue) per product from the daily rollup, best sellers first."""
+    where, params = _rollup_filter(None, start, end)
+    return get_conn().execute('SELECT product_id, SUM(units) AS units, SUM(revenue) AS revenue '
+                              f'FROM daily_sales{where} GROUP BY product_id ORDER BY revenue DESC', params).fetchall()
+
+
+def downsample_lttb(xs, ys, threshold):
+    """Reduce a series to threshold points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between contributes the
+    point forming the largest triangle with the previous pick and the average
+    of the next bucket, which preserves peaks and troughs.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(xs), list(ys)
+    out_x, out_y = [xs[0]], [ys[0]]
+    bucket = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * bucket) + 1
+        hi = int((i + 1) * bucket) + 1
+        nhi = min(int((i + 2) * bucket) + 1, n)
+        avg_x = sum(xs[hi:nhi]) / (nhi - hi)
+        avg_y = sum(ys[hi:nhi]) / (nhi - hi)
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+IMPORT_CHUNK_SIZE = 5000
+
+_UPSERT_SQL = ('INSERT INTO products (sku,name,description,price,quantity,min_quantity) VALUES (?, ?, ?, ?, ?, ?) '
+               'ON CONFLICT(sku) DO UPDATE SET name=excluded.name, description=excluded.description, '
+               'price=excluded.price, quantity=excluded.quantity, min_quantity=excluded.min_quantity')
+_INSERT_SQL = 'INSERT INTO products (sku,name,description,price,quantity,min_quantity) VALUES (?, ?, ?, ?, ?, ?)'
+
+
+def _coerce_product_row(row):
+    sku = (row.get('sku') or row.get('SKU') or '').strip() or None
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name required')
+    desc = row.get('description') or ''
+    try:
+        price = float(row.get('price') or 0)
+        qty = int(float(row.get('quantity') or 0))
+        minq = int(float(row.get('min_quantity') or row.get('min') or 5))
+    except ValueError as e:
+        raise ValueError(f'invalid number: {e}') from None
+    if price < 0 or qty < 0 or minq < 0:
+        raise ValueError('negative price or quantity')
+    return (sku, name, desc, price, qty, minq)
+
+
+def _write_product_chunk(conn, batch, upsert, rejects):
+    # batch holds (line, values); returns the number of rows written
+    if not upsert:
+        skus = [v[0] for _, v in batch if v[0]]
+        existing = set()
+        for i in range(0, len(skus), 500):
+            part = skus[i:i + 500]
+            marks = ','.join('?' * len(part))
+            existing.update(r[0] for r in conn.execute(f'SELECT sku FROM products WHERE sku IN ({marks})', part))
+        kept = []
+        for line, values in batch:
+            if values[0] and values[0] in existing:
+                rejects.append((line, f'duplicate sku {values[0]}'))
+                continue
+            existing.add(values[0])
+            kept.append((line, values))
+        batch = kept
+    # ledger: diff the quantities of existing SKUs, and log new rows (ids above the old max) whole
+    skus = [v[0] for _, v in batch if v[0]]
+    before = {}
+    for i in range(0, len(skus), 500):
+        part = skus[i:i + 500]
+        before.update(conn.execute(f"SELECT id, quantity FROM products WHERE sku IN ({','.join('?' * len(part))})", part).fetchall())
+    max_id = conn.execute('SELECT ifnull(max(id), 0) FROM products').fetchone()[0]
+    conn.executemany(_UPSERT_SQL if upsert else _INSERT_SQL, [v for _, v in batch])
+    changes = list(conn.execute('SELECT id, quantity FROM products WHERE id > ?', (max_id,)))
+    ids = list(before)
+    for i in range(0, len(ids), 500):
+        part = ids[i:i + 500]
+        changes.extend((pid, qty - before[pid]) for pid, qty in
+                       conn.execute(f"SELECT id, quantity FROM products WHERE id IN ({','.join('?' * len(part))})", part))
+    _log_movements(conn, 'import', changes)
+    return len(batch)
+
+
+@traced
+def import_products_csv(path, upsert=True, atomic=True, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Stream products from a CSV file into the database without the GUI.
+
+    Rows are validated and written in chunks with executemany. With upsert, a row
+    whose SKU already exists updates that product; otherwise it is rejected. With
+    atomic, the whole file is one transaction, else each chunk commits on its own.
+    progress(rows_read, fraction) is called after every chunk.
+
+    Returns (imported, rejects) where rejects is a list of (line, reason).
+    """
+    imported = 0
+    rejects = []
+    size = os.path.getsize(path) or 1
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        outer = transaction() if atomic else contextlib.nullcontext()
+        with outer:
+            batch = []
+            read = 0
+            for row in reader:
+                read += 1
+                # line 1 is the header
+                line = reader.line_num
+                try:
+                    batch.append((line, _coerce_product_row(row)))
+                except ValueError as e:
+                    rejects.append((line, str(e)))
+                if len(batch) >= chunk_size:
+                    with transaction() as conn:
+                        imported += _write_product_chunk(conn, batch, upsert, rejects)
+                    batch = []
+                    if progress:
+                        progress(read, f.buffer.tell() / size)
+            if batch:
+                with transaction() as conn:
+                    imported += _write_product_chunk(conn, batch, upsert, rejects)
+            if progress:
+                progress(read, 1.0)
+    rejects.sort()
+    return imported, rejects
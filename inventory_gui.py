@@ -0,0 +1,928 @@
+"""Tk dashboard for the inventory database; imported lazily by mainay."""
+import bisect
+import datetime
+import os
+import queue
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog, simpledialog
+
+
+import customtkinter as ctk
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+import matplotlib.dates as mdates
+
+import inventory_trace
+from inventory_analytics import LEAD_TIME_DAYS, analyze, apply_reorder_points
+from inventory_core import (
+    PAGE_SIZE, PRODUCT_SORT_COLUMNS, ProductSearch,
+    add_product, add_user, authenticate, backup_database, backup_dir, delete_product, disable_tracing,
+    downsample_lttb, enable_tracing, export_products_csv, export_sales_csv, get_product, get_product_changes,
+    get_products_page, import_products_csv, last_change_seq, maybe_snapshot_stock, product_cache_stats,
+    record_sale, restock_product, restore_database, sales_summary, transaction,
+)
+
+
+CHART_WINDOWS = {'30d': 30, '90d': 90, '1y': 365, 'All': None}
+CHART_MIN_POINTS = 100
+# markers are only drawn on short series
+CHART_MARKER_POINTS = 60
+
+
+# the Treeview holds at most this many rows; more are fetched by key while scrolling
+TREE_WINDOW = 3 * PAGE_SIZE
+# how often to check the database file for commits from other terminals
+CHANGE_POLL_MS = 2000
+# search runs once typing pauses for this long
+SEARCH_DEBOUNCE_MS = 250
+
+
+WORKER_THREADS = 4
+RUNNER_POLL_MS = 30
+
+# snapshot interval while the dashboard is open; 0 turns automatic backups off
+AUTO_BACKUP_MINUTES = 60
+# how often to check whether a stock ledger snapshot is due
+STOCK_SNAPSHOT_CHECK_MS = 15 * 60000
+
+# the Low Stock Report lists at most this many products, soonest to run out first
+LOW_STOCK_ROWS = 500
+
+
+class BackgroundRunner:
+    """Runs blocking work on a thread pool and hands results back on the Tk thread.
+
+    Results travel through a queue drained with after(), so callbacks never touch
+    Tk from a worker. A job submitted under a key supersedes the previous job with
+    that key: a pending one is cancelled and a running one has its result dropped.
+    Jobs submitted with quiet=True (periodic housekeeping) do not count as busy.
+    """
+
+    def __init__(self, root, workers=WORKER_THREADS, on_busy=None):
+        self._root = root
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inventory-worker')
+        self._results = queue.Queue()
+        self._latest = {}
+        self._pending = 0
+        self._quiet = 0
+        self._epoch = 0
+        self._draining = False
+        self._on_busy = on_busy
+
+    def submit(self, fn, *args, key=None, on_done=None, on_error=None, quiet=False):
+        token = object()
+        if key is not None:
+            old = self._latest.get(key)
+            if old is not None:
+                old[1].cancel()
+        future = self._pool.submit(fn, *args)
+        if key is not None:
+            self._latest[key] = (token, future)
+        epoch = self._epoch
+        future.add_done_callback(lambda f: self._results.put((token, key, epoch, f, on_done, on_error, quiet)))
+        if quiet:
+            self._quiet += 1
+        else:
+            self._pending += 1
+            if self._pending == 1 and self._on_busy:
+                self._on_busy(True)
+        self._schedule()
+        return future
+
+    def call_soon(self, fn, *args):
+        # for workers: run fn(*args) on the Tk thread, e.g. to report progress
+        self._results.put((None, None, self._epoch, None, lambda _: fn(*args), None, True))
+
+    def discard_all(self):
+        # results of everything submitted so far are dropped, e.g. after logout
+        self._epoch += 1
+        self._latest.clear()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self):
+        if not self._draining:
+            self._draining = True
+            self._root.after(RUNNER_POLL_MS, self._drain)
+
+    def _drain(self):
+        self._draining = False
+        while True:
+            try:
+                token, key, epoch, future, on_done, on_error, quiet = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if future is not None:
+                if quiet:
+                    self._quiet -= 1
+                else:
+                    self._pending -= 1
+                    if self._pending == 0 and self._on_busy:
+                        self._on_busy(False)
+                if key is not None and self._latest.get(key, (None,))[0] is token:
+                    del self._latest[key]
+                elif key is not None:
+                    continue
+            if epoch != self._epoch or (future is not None and future.cancelled()):
+                continue
+            exc = future.exception() if future is not None else None
+            try:
+                if exc is not None:
+                    if on_error:
+                        on_error(exc)
+                    else:
+                        messagebox.showerror('Error', str(exc))
+                elif on_done:
+                    on_done(future.result() if future is not None else None)
+            except Exception:
+                traceback.print_exc()
+        if self._pending or self._quiet:
+            self._schedule()
+
+
+class AdvancedInventoryApp(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+        self.title('Inventory Dashboard — Light Theme')
+        self.geometry('1100x700')
+        self.minsize(900,600)
+
+        # set appearance
+        ctk.set_appearance_mode('Light')
+        ctk.set_default_color_theme('blue')
+
+        self.current_user = None
+        self._runner = BackgroundRunner(self, on_busy=self._set_busy)
+        self.protocol('WM_DELETE_WINDOW', self._on_close)
+        self._build_login()
+
+    def _on_close(self):
+        self._runner.shutdown()
+        self.destroy()
+
+    def _set_busy(self, busy):
+        tk.Tk.configure(self, cursor='watch' if busy else '')
+        bar = getattr(self, '_busy_bar', None)
+        if bar is None or not bar.winfo_exists():
+            return
+        if busy:
+            bar.pack(side='right', padx=12)
+            bar.start()
+        else:
+            bar.stop()
+            bar.pack_forget()
+
+
+    def _build_login(self):
+        for w in self.winfo_children():
+            w.destroy()
+        frame = ctk.CTkFrame(self, corner_radius=8, fg_color='transparent')
+        frame.pack(expand=True, fill='both', padx=20, pady=20)
+
+        card = ctk.CTkFrame(frame, width=480, height=320, corner_radius=10)
+        card.place(relx=0.5, rely=0.5, anchor='center')
+
+        lbl = ctk.CTkLabel(card, text='Inventory Management', font=ctk.CTkFont(size=20, weight='bold'))
+        lbl.pack(pady=(20,8))
+        sub = ctk.CTkLabel(card, text='Login or Sign up to continue', text_color='#555555')
+        sub.pack(pady=(0,12))
+
+        self.username_var = ctk.StringVar()
+        self.password_var = ctk.StringVar()
+
+        user_entry = ctk.CTkEntry(card, placeholder_text='Username', textvariable=self.username_var, width=320)
+        user_entry.pack(pady=6)
+        pw_entry = ctk.CTkEntry(card, placeholder_text='Password', show='*', textvariable=self.password_var, width=320)
+        pw_entry.pack(pady=6)
+
+        btn_frame = ctk.CTkFrame(card, fg_color='transparent')
+        btn_frame.pack(pady=12)
+        login_btn = ctk.CTkButton(btn_frame, text='Login', width=120, command=self._do_login)
+        signup_btn = ctk.CTkButton(btn_frame, text='Sign up', width=120, command=self._do_signup)
+        login_btn.grid(row=0, column=0, padx=6)
+        signup_btn.grid(row=0, column=1, padx=6)
+
+        hint = ctk.CTkLabel(card, text='Default: admin / admin123', text_color='#888888')
+        hint.pack(pady=(10,6))
+
+    def _do_login(self):
+        username = self.username_var.get().strip()
+        password = self.password_var.get().strip()
+        if not username or not password:
+            messagebox.showwarning('Login', 'Enter username and password')
+            return
+
+        def done(ok):
+            if not ok:
+                messagebox.showerror('Login failed', 'Invalid credentials')
+                return
+            self.current_user = username
+            self._build_main_ui()
+
+        self._runner.submit(authenticate, username, password, key='login', on_done=done)
+
+    def _do_signup(self):
+        username = self.username_var.get().strip()
+        password = self.password_var.get().strip()
+        if not username or not password:
+            messagebox.showwarning('Sign up', 'Enter username and password')
+            return
+
+        def done(ok):
+            if ok:
+                messagebox.showinfo('Sign up', 'User created — you can login now')
+            else:
+                messagebox.showerror('Sign up', 'Username already exists')
+
+        self._runner.submit(add_user, username, password, key='signup', on_done=done)
+
+
+    def _build_main_ui(self):
+        for w in self.winfo_children():
+            w.destroy()
+
+
+        top = ctk.CTkFrame(self, height=48)
+        top.pack(fill='x')
+        user_lbl = ctk.CTkLabel(top, text=f'Logged in as: {self.current_user}', anchor='w')
+        user_lbl.pack(side='left', padx=12)
+        logout_btn = ctk.CTkButton(top, text='Logout', width=80, command=self._logout)
+        logout_btn.pack(side='right', padx=12)
+        self._busy_bar = ctk.CTkProgressBar(top, mode='indeterminate', width=120)
+
+
+        container = ctk.CTkFrame(self)
+        container.pack(fill='both', expand=True, padx=12, pady=12)
+
+        sidebar = ctk.CTkFrame(container, width=220, corner_radius=8)
+        sidebar.pack(side='left', fill='y', padx=(0,12), pady=6)
+
+        mainpanel = ctk.CTkFrame(container, corner_radius=8)
+        mainpanel.pack(side='left', fill='both', expand=True, pady=6)
+
+
+        add_btn = ctk.CTkButton(sidebar, text='Add Product', width=180, command=self._open_add_product, fg_color='#2ecc71')
+        add_btn.pack(pady=8, padx=12)
+        sell_btn = ctk.CTkButton(sidebar, text='Sell Product', width=180, command=self._sell_selected, fg_color='#f39c12')
+        sell_btn.pack(pady=8, padx=12)
+        restock_btn = ctk.CTkButton(sidebar, text='Restock', width=180, command=self._restock_selected, fg_color='#3498db')
+        restock_btn.pack(pady=8, padx=12)
+        delete_btn = ctk.CTkButton(sidebar, text='Delete Product', width=180, command=self._delete_selected, fg_color='#e74c3c')
+        delete_btn.pack(pady=8, padx=12)
+
+        import_btn = ctk.CTkButton(sidebar, text='Import CSV', width=180, command=self._import_products)
+        import_btn.pack(pady=(20,6), padx=12)
+        exp_prod_btn = ctk.CTkButton(sidebar, text='Export Products', width=180, command=self._export_products)
+        exp_prod_btn.pack(pady=6, padx=12)
+        exp_sales_btn = ctk.CTkButton(sidebar, text='Export Sales', width=180, command=self._export_sales)
+        exp_sales_btn.pack(pady=6, padx=12)
+        backup_btn = ctk.CTkButton(sidebar, text='Backup Now', width=180, command=self._backup_now)
+        backup_btn.pack(pady=6, padx=12)
+        restore_btn = ctk.CTkButton(sidebar, text='Restore Backup', width=180, command=self._restore_backup)
+        restore_btn.pack(pady=6, padx=12)
+
+        low_btn = ctk.CTkButton(sidebar, text='Low Stock Report', width=180, command=self._show_low_stock)
+        low_btn.pack(pady=(20,6), padx=12)
+        diag_btn = ctk.CTkButton(sidebar, text='Diagnostics', width=180, command=self._open_diagnostics, fg_color='#7f8c8d')
+        diag_btn.pack(pady=6, padx=12)
+
+
+        search_frame = ctk.CTkFrame(mainpanel)
+        search_frame.pack(fill='x', padx=8, pady=8)
+        self.search_var = ctk.StringVar()
+        search_entry = ctk.CTkEntry(search_frame, placeholder_text='Search by name or SKU', textvariable=self.search_var)
+        search_entry.pack(side='left', fill='x', expand=True, padx=(8,4))
+        search_entry.bind('<Return>', lambda _: self._do_search())
+        self.search_var.trace_add('write', self._on_search_typed)
+        self._search_after = None
+        self._product_search = ProductSearch()
+        search_btn = ctk.CTkButton(search_frame, text='Search', width=100, command=self._do_search)
+        search_btn.pack(side='left', padx=4)
+        refresh_btn = ctk.CTkButton(search_frame, text='Refresh', width=100, command=self._refresh_table)
+        refresh_btn.pack(side='left', padx=4)
+
+
+        table_frame = ctk.CTkFrame(mainpanel)
+        table_frame.pack(fill='both', expand=True, padx=8, pady=(0,8))
+        cols = ('id','sku','name','price','quantity','min_quantity')
+        tree = ttk.Treeview(table_frame, columns=cols, show='headings', selectmode='browse')
+        for c in cols:
+            if c in PRODUCT_SORT_COLUMNS:
+                tree.heading(c, text=c.title(), command=lambda c=c: self._sort_by(c))
+            else:
+                tree.heading(c, text=c.title())
+            tree.column(c, anchor='center')
+        tree.tag_configure('low', background='#ffecec')
+        vsb = ttk.Scrollbar(table_frame, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=self._on_tree_scroll)
+        self._vsb = vsb
+        self._sort = ('name', False)
+        self._paging = False
+        self._table_gen = 0
+        self._rows = {}
+        self._search = None
+        self._change_seq = 0
+        tree.pack(side='left', fill='both', expand=True)
+        vsb.pack(side='right', fill='y')
+        self.tree = tree
+
+        # bottom chart area
+        chart_frame = ctk.CTkFrame(self, height=220)
+        chart_frame.pack(fill='x', padx=12, pady=(0,12))
+        chart_label = ctk.CTkLabel(chart_frame, text='Sales Over Time', font=ctk.CTkFont(size=14, weight='bold'))
+        chart_label.pack(anchor='w', padx=12, pady=(6,0))
+        self._chart_window = ctk.StringVar(value='90d')
+        window_btn = ctk.CTkSegmentedButton(chart_frame, values=list(CHART_WINDOWS), variable=self._chart_window,
+                                            command=lambda _: self._draw_chart())
+        window_btn.place(relx=1.0, x=-12, y=6, anchor='ne')
+        self._chart_container = ctk.CTkFrame(chart_frame, fg_color='transparent')
+        self._chart_container.pack(fill='both', expand=True, padx=8, pady=6)
+        self._build_chart()
+
+        self._populate_table()
+        self._draw_chart()
+        self._poll_id = self.after(CHANGE_POLL_MS, self._poll_changes)
+        self._backup_id = self.after(AUTO_BACKUP_MINUTES * 60000, self._auto_backup) if AUTO_BACKUP_MINUTES else None
+        self._snapshot_id = self.after(STOCK_SNAPSHOT_CHECK_MS, self._snapshot_stock)
+
+    def _logout(self):
+        self.after_cancel(self._poll_id)
+        if self._backup_id:
+            self.after_cancel(self._backup_id)
+        self.after_cancel(self._snapshot_id)
+        if self._search_after:
+            self.after_cancel(self._search_after)
+        self._runner.discard_all()
+        self.current_user = None
+        self._build_login()
+
+
+    def _populate_table(self, search=None):
+        sort = self._sort
+
+        def load():
+            if search:
+                # bounded by SEARCH_LIMIT; None when a newer search took over
+                return self._product_search.search(search)
+            # one read transaction, so the change seq matches the rows
+            with transaction(immediate=False):
+                return last_change_seq(), get_products_page(*sort)
+
+        def done(res):
+            if res is not None:
+                self._show_rows(search, *res)
+
+        self._runner.submit(load, key='table', on_done=done)
+
+    def _show_rows(self, search, seq, rows):
+        self.tree.delete(*self.tree.get_children())
+        self._rows = {}
+        self._search = search
+        self._change_seq = seq
+        self._table_gen += 1
+        if search:
+            self._more_before = self._more_after = False
+        else:
+            self._more_before, self._more_after = False, len(rows) == PAGE_SIZE
+        self._insert_rows(rows)
+        self._update_headings()
+
+    def _row_item(self, r):
+        vals = (r['id'], r['sku'] or '', r['name'], f"{r['price']:.2f}", r['quantity'], r['min_quantity'])
+        tags = ('low',) if r['quantity'] <= r['min_quantity'] else ()
+        return vals, tags
+
+    def _insert_rows(self, rows, at_top=False):
+        for i, r in enumerate(rows):
+            iid = str(r['id'])
+            vals, tags = self._row_item(r)
+            self.tree.insert('', i if at_top else 'end', iid=iid, values=vals, tags=tags)
+            self._rows[iid] = r
+
+    def _on_tree_scroll(self, first, last):
+        self._vsb.set(first, last)
+        if self._paging:
+            return
+        if float(last) >= 0.98 and self._more_after:
+            self._paging = True
+            self.after_idle(self._load_page, True)
+        elif float(first) <= 0.02 and self._more_before:
+            self._paging = True
+            self.after_idle(self._load_page, False)
+
+    def _load_page(self, forward):
+        children = self.tree.get_children()
+        if not children:
+            self._paging = False
+            return
+        col, desc = self._sort
+        edge = self._rows[children[-1] if forward else children[0]]
+        key = (edge[col], edge['id'])
+        if forward:
+            job = lambda: get_products_page(col, desc, after=key)
+        else:
+            job = lambda: get_products_page(col, desc, before=key)
+        gen = self._table_gen
+
+        def failed(exc):
+            self._paging = False
+            messagebox.showerror('Error', str(exc))
+
+        self._runner.submit(job, key='page', on_done=lambda rows: self._show_page(forward, gen, rows), on_error=failed)
+
+    def _show_page(self, forward, gen, rows):
+        # keep at most TREE_WINDOW rows: add the fetched page, drop the far end
+        self._paging = False
+        children = self.tree.get_children()
+        if gen != self._table_gen or not children:
+            return
+        if forward:
+            self._more_after = len(rows) == PAGE_SIZE
+            self._insert_rows(rows)
+            drop = children[:max(0, len(children) + len(rows) - TREE_WINDOW)]
+            anchor = children[-1]
+        else:
+            self._more_before = len(rows) == PAGE_SIZE
+            self._insert_rows(rows, at_top=True)
+            drop = children[max(0, TREE_WINDOW - len(rows)):]
+            anchor = children[0]
+        if drop:
+            if forward:
+                self._more_before = True
+            else:
+                self._more_after = True
+            self.tree.delete(*drop)
+            for iid in drop:
+                del self._rows[iid]
+        if self.tree.exists(anchor):
+            self.tree.see(anchor)
+
+    def _sort_by(self, col):
+        cur, desc = self._sort
+        self._sort = (col, not desc if cur == col else False)
+        if self._search:
+            col, desc = self._sort
+            rows = sorted(self._rows.values(), key=lambda r: (r[col] is not None, r[col] or 0, r['id']), reverse=desc)
+            for i, r in enumerate(rows):
+                self.tree.move(str(r['id']), '', i)
+            self._update_headings()
+        else:
+            self._populate_table()
+
+    def _update_headings(self):
+        col, desc = self._sort
+        for c in self.tree['columns']:
+            arrow = (' ▼' if desc else ' ▲') if c == col else ''
+            self.tree.heading(c, text=c.title() + arrow)
+
+    def _refresh_table(self):
+        self._populate_table(self.search_var.get().strip() or None)
+        self._draw_chart()
+
+    def _sort_key(self, r):
+        col = self._sort[0]
+        # NULL sorts first, matching SQLite
+        return (r[col] is not None, r[col] if r[col] is not None else 0, r['id'])
+
+    def _apply_changes(self, redraw_chart=True):
+        self._runner.submit(get_product_changes, self._change_seq, PAGE_SIZE, key='changes', on_done=self._show_changes)
+        if redraw_chart:
+            self._draw_chart()
+
+    def _show_changes(self, changes):
+        if changes is None:
+            self._populate_table(self._search)
+            return
+        seq, rows, deleted = changes
+        # a full reload may have finished while this ran; rows are current either way
+        self._change_seq = max(self._change_seq, seq)
+        for pid in deleted:
+            iid = str(pid)
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+                del self._rows[iid]
+        for r in rows:
+            self._apply_row(r)
+
+    def _apply_row(self, r):
+        iid = str(r['id'])
+        present = self.tree.exists(iid)
+        if self._search:
+            # search results are not re-matched; rows already listed are updated in place
+            if present:
+                vals, tags = self._row_item(r)
+                self.tree.item(iid, values=vals, tags=tags)
+                self._rows[iid] = r
+            return
+        others = [c for c in self.tree.get_children() if c != iid]
+        keys = [self._sort_key(self._rows[c]) for c in others]
+        if self._sort[1]:
+            idx = len(keys) - bisect.bisect_left(keys[::-1], self._sort_key(r))
+        else:
+            idx = bisect.bisect_left(keys, self._sort_key(r))
+        # rows that now sort outside the loaded window are left for paging to fetch
+        if (idx == 0 and others and self._more_before) or (idx == len(others) and self._more_after):
+            if present:
+                self.tree.delete(iid)
+                del self._rows[iid]
+            return
+        if present:
+            vals, tags = self._row_item(r)
+            self.tree.item(iid, values=vals, tags=tags)
+            self._rows[iid] = r
+        else:
+            self._insert_rows([r])
+        self.tree.move(iid, '', idx)
+
+    def _poll_changes(self):
+        # on a worker: after close_conns() or during another terminal's VACUUM this
+        # can wait out BUSY_TIMEOUT. PRAGMA data_version is per connection and the
+        # pool has several, so the change log's sequence is compared instead
+        self._runner.submit(last_change_seq, key='poll', on_done=self._polled, on_error=self._poll_failed,
+                            quiet=True)
+        self._poll_id = self.after(CHANGE_POLL_MS, self._poll_changes)
+
+    def _polled(self, seq):
+        # _table_gen is 0 until the first load, which brings its own seq
+        if self._table_gen and seq != self._change_seq:
+            self._apply_changes()
+
+    def _poll_failed(self, exc):
+        # e.g. database is locked; the next tick tries again
+        pass
+
+    def _on_search_typed(self, *_):
+        if self._search_after:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DEBOUNCE_MS, self._live_search)
+
+    def _live_search(self):
+        self._search_after = None
+        search = self.search_var.get().strip() or None
+        # e.g. a trailing space: the table already shows these results
+        if search != self._search:
+            self._populate_table(search)
+
+    def _do_search(self):
+        if self._search_after:
+            self.after_cancel(self._search_after)
+            self._search_after = None
+        self._populate_table(self.search_var.get().strip() or None)
+
+
+    def _open_add_product(self):
+        dlg = ProductDialog(self, 'Add Product')
+        self.wait_window(dlg)
+        if dlg.result:
+
+            def done(ok):
+                if not ok:
+                    messagebox.showerror('Error', 'SKU must be unique')
+                self._apply_changes(redraw_chart=False)
+
+            self._runner.submit(add_product, *dlg.result, on_done=done)
+
+    def _get_selected_pid(self):
+        sel = self.tree.selection()
+        if not sel:
+            messagebox.showwarning('Select', 'Select a product')
+            return None
+        pid = self.tree.item(sel[0])['values'][0]
+        return pid
+
+    def _delete_selected(self):
+        pid = self._get_selected_pid()
+        if not pid:
+            return
+        if messagebox.askyesno('Confirm', 'Delete product?'):
+            self._runner.submit(delete_product, pid, on_done=lambda _: self._apply_changes(redraw_chart=False))
+
+    def _sell_selected(self):
+        pid = self._get_selected_pid()
+        if not pid:
+            return
+
+        def ask(product):
+            if not product:
+                messagebox.showerror('Error', 'Product not found')
+                return
+            qty = simpledialog.askinteger('Sell', f"Quantity to sell (Available: {product['quantity']})", minvalue=1)
+            if qty:
+                self._runner.submit(record_sale, pid, qty, on_done=sold)
+
+        def sold(result):
+            ok, err = result
+            if not ok:
+                messagebox.showerror('Error', err)
+            else:
+                messagebox.showinfo('Sold', 'Sale recorded')
+            self._apply_changes()
+
+        self._runner.submit(get_product, pid, on_done=ask)
+
+    def _restock_selected(self):
+        pid = self._get_selected_pid()
+        if not pid:
+            return
+        qty = simpledialog.askinteger('Restock', 'Quantity to add', minvalue=1)
+        if qty:
+
+            def done(_):
+                messagebox.showinfo('Restock', 'Product restocked')
+                self._apply_changes(redraw_chart=False)
+
+            self._runner.submit(restock_product, pid, qty, on_done=done)
+
+    def _import_products(self):
+        path = filedialog.askopenfilename(filetypes=[('CSV Files','*.csv')])
+        if not path:
+            return
+        win = ctk.CTkToplevel(self)
+        win.title('Import')
+        win.geometry('360x120')
+        win.transient(self)
+        win.grab_set()
+        status = ctk.CTkLabel(win, text='Importing products...')
+        status.pack(pady=(16,8))
+        bar = ctk.CTkProgressBar(win, width=300)
+        bar.set(0)
+        bar.pack(pady=8)
+
+        def progress(n, frac):
+            if win.winfo_exists():
+                bar.set(frac)
+                status.configure(text=f'Read {n} rows...')
+
+        def done(result):
+            win.destroy()
+            imported, rejects = result
+            msg = f'Imported {imported} products'
+            if rejects:
+                lines = '\n'.join(f'line {line}: {reason}' for line, reason in rejects[:10])
+                more = f'\n... and {len(rejects) - 10} more' if len(rejects) > 10 else ''
+                msg += f'\nRejected {len(rejects)} rows:\n{lines}{more}'
+            messagebox.showinfo('Import', msg)
+            self._refresh_table()
+
+        def failed(exc):
+            win.destroy()
+            messagebox.showerror('Import', f'Import failed, nothing was imported: {exc}')
+
+        report = lambda n, frac: self._runner.call_soon(progress, n, frac)
+        self._runner.submit(lambda: import_products_csv(path, progress=report), on_done=done, on_error=failed)
+
+    def _export_products(self):
+        path = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV Files','*.csv'), ('Gzipped CSV','*.csv.gz')])
+        if not path:
+            return
+        self._runner.submit(export_products_csv, path,
+                            on_done=lambda res: messagebox.showinfo('Export', f'Exported {res[0]} products ({res[1]:.0f} rows/sec)'))
+
+    def _export_sales(self):
+        rng = simpledialog.askstring('Export Sales', 'Date range YYYY-MM-DD..YYYY-MM-DD (leave blank for all)')
+        if rng is None:
+            return
+        start = end = None
+        if rng.strip():
+            try:
+                a, _, b = rng.partition('..')
+                start = datetime.date.fromisoformat(a.strip()) if a.strip() else None
+                # the dialog range is inclusive, export_sales_csv's end is not
+                end = datetime.date.fromisoformat(b.strip()) + datetime.timedelta(days=1) if b.strip() else None
+            except ValueError:
+                messagebox.showerror('Export', 'Invalid date range')
+                return
+        path = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV Files','*.csv'), ('Gzipped CSV','*.csv.gz')])
+        if not path:
+            return
+        self._runner.submit(export_sales_csv, path, start, end,
+                            on_done=lambda res: messagebox.showinfo('Export', f'Exported {res[0]} sales ({res[1]:.0f} rows/sec)'))
+
+    def _backup_now(self):
+
+        def done(m):
+            rate = m['bytes'] / 1e6 / m['seconds'] if m['seconds'] else 0
+            messagebox.showinfo('Backup', f"Saved {os.path.basename(m['path'])}\n{m['bytes'] / 1e6:.1f} MB in {m['seconds']:.1f} s "
+                                          f"({rate:.0f} MB/s), longest step {m['max_step_ms']:.0f} ms, integrity ok")
+
+        self._runner.submit(backup_database, 'manual', key='backup', on_done=done)
+
+    def _auto_backup(self):
+        self._runner.submit(backup_database, 'auto', key='backup', quiet=True)
+        self._backup_id = self.after(AUTO_BACKUP_MINUTES * 60000, self._auto_backup)
+
+    def _snapshot_stock(self):
+        # the data layer decides whether a ledger snapshot is due
+        self._runner.submit(maybe_snapshot_stock, key='stock_snapshot', quiet=True)
+        self._snapshot_id = self.after(STOCK_SNAPSHOT_CHECK_MS, self._snapshot_stock)
+
+    def _restore_backup(self):
+        path = filedialog.askdirectory(initialdir=backup_dir(), title='Choose a snapshot folder')
+        if not path:
+            return
+        if not os.path.isfile(os.path.join(path, 'manifest.json')):
+            messagebox.showerror('Restore', 'Not a backup snapshot folder')
+            return
+        if not messagebox.askyesno('Restore', f'Replace the current data with {os.path.basename(path)}?\n'
+                                              'A copy of the current data is saved first.'):
+            return
+
+        def done(m):
+            messagebox.showinfo('Restore', f"Restored {m['created']} in {m['restore_seconds']:.1f} s")
+            self._refresh_table()
+
+        self._runner.submit(restore_database, path, key='backup', on_done=done)
+
+    def _show_low_stock(self):
+
+        def load():
+            analysis = analyze()
+            return analysis, analysis.low_stock(LOW_STOCK_ROWS)
+
+        self._runner.submit(load, key='low_stock', on_done=self._show_low_stock_rows)
+
+    def _show_low_stock_rows(self, result):
+        analysis, rows = result
+        if not rows:
+            messagebox.showinfo('Low Stock', 'No low stock items')
+            return
+        win = ctk.CTkToplevel(self)
+        win.title('Low Stock Items')
+        win.geometry('960x460')
+        win.transient(self)
+        ctk.CTkLabel(win, text=f'{len(rows)} products at or below min quantity or reorder point '
+                               f'(sales {analysis.start} to {analysis.end}, lead time {LEAD_TIME_DAYS} days)').pack(pady=(12,6))
+        frame = ctk.CTkFrame(win)
+        frame.pack(fill='both', expand=True, padx=12, pady=6)
+        cols = ('sku','name','quantity','min_quantity','reorder_point','velocity','days_of_cover','abc')
+        tree = ttk.Treeview(frame, columns=cols, show='headings')
+        for c in cols:
+            tree.heading(c, text=c.replace('_', ' ').title())
+            tree.column(c, anchor='center', width=240 if c == 'name' else 90)
+        for r in rows:
+            cover = '' if r['days_of_cover'] is None else r['days_of_cover']
+            tree.insert('', 'end', values=(r['sku'] or '', r['name'], r['quantity'], r['min_quantity'],
+                                           r['reorder_point'], r['velocity'], cover, r['abc']))
+        vsb = ttk.Scrollbar(frame, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.pack(side='left', fill='both', expand=True)
+        vsb.pack(side='right', fill='y')
+
+        changes = analysis.reorder_changes()
+
+        def apply():
+            if not messagebox.askyesno('Reorder points', f'Set min quantity to the reorder point for {len(changes)} products?', parent=win):
+                return
+
+            def done(n):
+                win.destroy()
+                messagebox.showinfo('Reorder points', f'Updated {n} products')
+                self._apply_changes(redraw_chart=False)
+
+            self._runner.submit(apply_reorder_points, changes, on_done=done)
+
+        apply_btn = ctk.CTkButton(win, text=f'Apply suggested minimums ({len(changes)})', command=apply,
+                                  state='normal' if changes else 'disabled')
+        apply_btn.pack(pady=(6,12))
+
+    def _open_diagnostics(self):
+        win = ctk.CTkToplevel(self)
+        win.title('Diagnostics')
+        win.geometry('900x520')
+        win.transient(self)
+        bar = ctk.CTkFrame(win, fg_color='transparent')
+        bar.pack(fill='x', padx=12, pady=(12,6))
+        text = ctk.CTkTextbox(win, font=ctk.CTkFont(family='Courier', size=12), wrap='none')
+        text.pack(fill='both', expand=True, padx=12, pady=(0,12))
+
+        def show():
+            text.configure(state='normal')
+            text.delete('1.0', 'end')
+            cache = product_cache_stats()
+            search = self._product_search.stats()
+            text.insert('1.0', f"product cache: {cache['size']}/{cache['capacity']} records, {cache['hits']} hits, "
+                               f"{cache['misses']} misses ({cache['hit_rate']:.0%}), {cache['evictions']} evictions, "
+                               f"{cache['invalidations']} invalidations\n"
+                               f"search: {search['queries']} queries, {search['hits']} cached, "
+                               f"{search['narrowed']} narrowed in memory, {search['interrupted']} interrupted\n\n"
+                               + inventory_trace.format_stats())
+            text.configure(state='disabled')
+
+        def toggle():
+            if tracing.get():
+                enable_tracing()
+            else:
+                disable_tracing()
+            show()
+
+        def reset():
+            inventory_trace.reset()
+            show()
+
+        def save():
+            path = filedialog.asksaveasfilename(parent=win, defaultextension='.json', filetypes=[('JSON Files','*.json')])
+            if path:
+                inventory_trace.dump(path)
+
+        tracing = ctk.BooleanVar(value=inventory_trace.enabled)
+        ctk.CTkSwitch(bar, text='Record query stats', variable=tracing, command=toggle).pack(side='left', padx=4)
+        ctk.CTkButton(bar, text='Refresh', width=90, command=show).pack(side='right', padx=4)
+        ctk.CTkButton(bar, text='Save JSON', width=90, command=save).pack(side='right', padx=4)
+        ctk.CTkButton(bar, text='Reset', width=90, command=reset).pack(side='right', padx=4)
+        show()
+
+    def _build_chart(self):
+        fig = Figure(figsize=(9,2.4), dpi=100)
+        ax = fig.add_subplot(111)
+        ax.set_title('Sales Over Time')
+        ax.set_xlabel('Day')
+        ax.set_ylabel('Total Sales')
+        ax.xaxis_date()
+        fig.autofmt_xdate(rotation=30)
+        self._chart_line, = ax.plot([], [])
+        self._chart_empty = ax.text(0.5, 0.5, 'No sales data yet', transform=ax.transAxes, ha='center', va='center', color='#666666')
+        self._chart_ax = ax
+        self._chart_canvas = FigureCanvasTkAgg(fig, master=self._chart_container)
+        self._chart_canvas.get_tk_widget().pack(fill='both', expand=True)
+
+    def _draw_chart(self):
+        days = CHART_WINDOWS[self._chart_window.get()]
+        start = datetime.date.today() - datetime.timedelta(days=days) if days else None
+        # roughly one point per two pixels is all the canvas can show
+        points = max(CHART_MIN_POINTS, self._chart_canvas.get_tk_widget().winfo_width() // 2)
+
+        def load():
+            data = sales_summary(start)
+            xs = [mdates.date2num(datetime.date.fromisoformat(row[0])) for row in data]
+            return downsample_lttb(xs, [row[1] for row in data], points)
+
+        self._runner.submit(load, key='chart', on_done=lambda series: self._plot_sales(*series))
+
+    def _plot_sales(self, xs, ys):
+        self._chart_line.set_data(xs, ys)
+        self._chart_line.set_marker('o' if len(xs) <= CHART_MARKER_POINTS else '')
+        self._chart_empty.set_visible(not xs)
+        if xs:
+            ax = self._chart_ax
+            ax.relim()
+            ax.autoscale_view()
+            if len(xs) == 1:
+                ax.set_xlim(xs[0] - 1, xs[0] + 1)
+        self._chart_canvas.draw_idle()
+
+
+
+class ProductDialog(ctk.CTkToplevel):
+    def __init__(self, parent, title, product=None):
+        super().__init__(parent)
+        self.title(title)
+        self.result = None
+        self.geometry('480x320')
+        self.transient(parent)
+        self.grab_set()
+
+        frm = ctk.CTkFrame(self, corner_radius=8)
+        frm.pack(fill='both', expand=True, padx=12, pady=12)
+
+        self.sku_var = ctk.StringVar(value=product['sku'] if product else '')
+        self.name_var = ctk.StringVar(value=product['name'] if product else '')
+        self.desc_var = ctk.StringVar(value=product['description'] if product else '')
+        self.price_var = ctk.StringVar(value=str(product['price']) if product else '0.0')
+        self.qty_var = ctk.StringVar(value=str(product['quantity']) if product else '0')
+        self.min_var = ctk.StringVar(value=str(product['min_quantity']) if product else '5')
+
+        rows = [
+            ('SKU', self.sku_var), ('Name', self.name_var), ('Description', self.desc_var),
+            ('Price', self.price_var), ('Quantity', self.qty_var), ('Min Quantity', self.min_var)
+        ]
+        for label, var in rows:
+            r = ctk.CTkFrame(frm, fg_color='transparent')
+            r.pack(fill='x', pady=4)
+            ctk.CTkLabel(r, text=label, width=12).pack(side='left', padx=(0,8))
+            ctk.CTkEntry(r, textvariable=var).pack(side='left', fill='x', expand=True)
+
+        btn_frame = ctk.CTkFrame(frm, fg_color='transparent')
+        btn_frame.pack(pady=12)
+        save_btn = ctk.CTkButton(btn_frame, text='Save', width=100, command=self._on_save)
+        cancel_btn = ctk.CTkButton(btn_frame, text='Cancel', width=100, command=self.destroy)
+        save_btn.grid(row=0, column=0, padx=8)
+        cancel_btn.grid(row=0, column=1, padx=8)
+
+    def _on_save(self):
+        try:
+            sku = self.sku_var.get().strip() or None
+            name = self.name_var.get().strip()
+            desc = self.desc_var.get().strip()
+            price = float(self.price_var.get())
+            qty = int(float(self.qty_var.get()))
+            minq = int(float(self.min_var.get()))
+            if not name:
+                messagebox.showwarning('Validation', 'Name required')
+                return
+            self.result = (sku, name, desc, price, qty, minq)
+            self.destroy()
+        except Exception:
+            messagebox.showerror('Validation', 'Invalid numeric values')
@@ -0,0 +1,257 @@
+"""Opt-in query tracing: latency histograms and a slow-query log.
+
+Tracing is off unless INVENTORY_TRACE is set in the environment or
+inventory_core.enable_tracing() is called. While it is off, connections are
+plain sqlite3.Connection objects and @traced functions cost a single flag
+check.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import functools
+import collections
+import sqlite3
+
+log = logging.getLogger('inventory.slow')
+
+enabled = bool(os.environ.get('INVENTORY_TRACE'))
+SLOW_QUERY_MS = float(os.environ.get('INVENTORY_SLOW_MS') or 100)
+SLOW_LOG_SIZE = 100
+# histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+_lock = threading.Lock()
+_functions = {}
+_statements = {}
+_executed = [0]
+_slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile, capped by the max seen
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (self.max,), self.counts):
+            seen += n
+            if seen >= rank:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max, 3),
+            'buckets': dict(zip([f'<={b}' for b in BUCKETS_MS] + ['inf'], self.counts)),
+        }
+
+
+def _record(table, key, ms):
+    with _lock:
+        hist = table.get(key)
+        if hist is None:
+            hist = table[key] = Histogram()
+        hist.add(ms)
+
+
+def _count_statement(sql):
+    # set_trace_callback also fires for statements run inside triggers and
+    # cursor.execute calls the wrapper below never sees; only the total is
+    # kept because the traced text has the parameters bound in
+    with _lock:
+        _executed[0] += 1
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that adds the time spent fetching rows to its statement's latency.
+
+    execute() only steps to the first row, so a statement is recorded once
+    the cursor is exhausted, closed or dropped, with the time spent inside
+    execute and the fetch calls (not the caller's work between them).
+    """
+
+    _sql = None
+
+    def _trace(self, sql, params, ms):
+        self._sql, self._params, self._ms = sql, params, ms
+        if self.description is None:
+            # no result rows, e.g. UPDATE or PRAGMA without output
+            self._finish()
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            self.connection._finished(sql, self._params, self._ms)
+
+    def _timed(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self._ms += (time.perf_counter() - start) * 1000
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # e.g. conn.execute(...).fetchone() leaves the rest of the rows unread
+        self._finish()
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection that times execute/executemany, row fetching included, and logs slow statements."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_count_statement)
+
+    def execute(self, sql, params=()):
+        cur = self.cursor(TracedCursor)
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        cur._trace(sql, params, (time.perf_counter() - start) * 1000)
+        return cur
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        cur = super().executemany(sql, seq_of_params)
+        self._finished(sql, None, (time.perf_counter() - start) * 1000)
+        return cur
+
+    def _finished(self, sql, params, ms):
+        key = ' '.join(sql.split())
+        _record(_statements, key, ms)
+        if ms >= SLOW_QUERY_MS and params is not None and key.upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')):
+            try:
+                plan = [r[3] for r in super().execute('EXPLAIN QUERY PLAN ' + sql, params)]
+            except sqlite3.Error as e:
+                plan = [f'unavailable: {e}']
+            entry = {'at': time.time(), 'ms': round(ms, 3), 'sql': key, 'plan': plan}
+            with _lock:
+                _slow.append(entry)
+            log.warning('slow query %.1f ms: %s | plan: %s', ms, key, '; '.join(plan))
+
+
+def traced(fn):
+    """Record wall-clock latency of fn per call while tracing is enabled."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record(_functions, name, (time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+def enable(slow_ms=None):
+    global enabled, SLOW_QUERY_MS
+    if slow_ms is not None:
+        SLOW_QUERY_MS = slow_ms
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _functions.clear()
+        _statements.clear()
+        _executed[0] = 0
+        _slow.clear()
+
+
+def stats():
+    with _lock:
+        return {
+            'enabled': enabled,
+            'slow_query_ms': SLOW_QUERY_MS,
+            'functions': {k: h.as_dict() for k, h in sorted(_functions.items())},
+            'statements': {k: h.as_dict() for k, h in sorted(_statements.items(), key=lambda kv: -kv[1].total)},
+            'statements_executed': _executed[0],
+            'slow_queries': list(_slow),
+        }
+
+
+def dump(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stats(), f, indent=2)
+
+
+def format_stats(st=None, top=15):
+    """Plain-text report of stats() for the diagnostics panel."""
+    st = st or stats()
+    lines = [f"tracing {'on' if st['enabled'] else 'off'}, slow query threshold {st['slow_query_ms']} ms, "
+             f"{st['statements_executed']} statements executed", '']
+    header = f"{'calls':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'total ms':>10}  "
+    lines.append(header + 'function')
+    for name, h in sorted(st['functions'].items(), key=lambda kv: -kv[1]['total_ms']):
+        lines.append(f"{h['count']:>8} {h['p50_ms']:>9} {h['p95_ms']:>9} {h['max_ms']:>9} {h['total_ms']:>10}  {name}")
+    lines += ['', header + 'statement']
+    for sql, h in list(st['statements'].items())[:top]:
+        lines.append(f"{h['count']:>8} {h['p50_ms']:>9} {h['p95_ms']:>9} {h['max_ms']:>9} {h['total_ms']:>10}  {sql[:120]}")
+    lines += ['', f"slow queries (last {len(st['slow_queries'])})"]
+    for e in reversed(st['slow_queries']):
+        lines.append(f"{e['ms']:>9} ms  {e['sql'][:120]}")
+        lines.extend(f'             {p}' for p in e['plan'])
+    return '\n'.join(lines)
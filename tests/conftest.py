@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inventory_core as core  # noqa: E402
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """Point the data layer at an empty database file for one test."""
+    core.close_conns()
+    monkeypatch.setattr(core, 'DB_FILE', str(tmp_path / 'inventory.db'))
+    monkeypatch.setattr(core, 'USE_COORDINATOR', False)
+    yield core.DB_FILE
+    core.close_conns()
@@ -0,0 +1,66 @@
+import sqlite3
+
+import inventory_core as core
+
+# init_db() of the baseline commit (5b4a2d7), before schema versioning
+BASELINE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    sku TEXT UNIQUE,
+    name TEXT NOT NULL,
+    description TEXT,
+    price REAL NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    min_quantity INTEGER NOT NULL DEFAULT 5
+);
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    product_id INTEGER,
+    quantity INTEGER,
+    total_price REAL,
+    sold_at TEXT,
+    FOREIGN KEY(product_id) REFERENCES products(id)
+);
+'''
+
+
+def migrate_step_by_step():
+    assert core.schema_version() == 0
+    for version, description, _, _ in core.MIGRATIONS:
+        assert core.migrate(version) == version, description
+        assert core.schema_version() == version, description
+        assert core.check_query_plans(version) == [], description
+    assert core.schema_version() == core.SCHEMA_VERSION
+
+
+def test_fresh_database(db_file):
+    with core.transaction() as conn:
+        core._create_base_schema(conn)
+    migrate_step_by_step()
+    # already current: nothing left to do
+    assert core.migrate() == core.SCHEMA_VERSION
+    assert core.check_query_plans() == []
+
+
+def test_baseline_database(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO products (sku, name, description, price, quantity, min_quantity) VALUES (?, ?, ?, ?, ?, ?)',
+                     [(f'SKU-{i:03d}', f'widget {i}', 'from the baseline', 2.5, i, 5) for i in range(1, 51)])
+    conn.executemany('INSERT INTO sales (product_id, quantity, total_price, sold_at) VALUES (?, ?, ?, ?)',
+                     [(i % 50 + 1, 1 + i % 3, 2.5 * (1 + i % 3), f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}T12:00:00')
+                      for i in range(500)])
+    conn.commit()
+    conn.close()
+
+    migrate_step_by_step()
+    # the backfills saw the existing rows
+    assert core.verify_daily_sales() == []
+    assert core.reconcile_stock() == []
+    assert [r['sku'] for r in core.get_products('widget 7', 5)][0] == 'SKU-007'
+